@@ -14,10 +14,15 @@ def add_contacts_column():
         print("Database file not found. No migration needed.")
         return
     
+    conn = None
     try:
-        conn = sqlite3.connect(db_path)
+        # Autocommit mode so the transaction below is controlled explicitly
+        conn = sqlite3.connect(db_path, isolation_level=None)
         cursor = conn.cursor()
         
+        # Take the write lock up front so the check and the ALTER can't race
+        cursor.execute("BEGIN IMMEDIATE")
+        
         # Check if contacts column already exists
         cursor.execute("PRAGMA table_info(properties)")
         columns = [column[1] for column in cursor.fetchall()]
@@ -25,15 +30,19 @@ def add_contacts_column():
         if 'contacts' not in columns:
             print("Adding contacts column to properties table...")
             cursor.execute("ALTER TABLE properties ADD COLUMN contacts TEXT")
-            conn.commit()
+            cursor.execute("COMMIT")
             print("✅ Contacts column added successfully!")
         else:
+            cursor.execute("COMMIT")
             print("✅ Contacts column already exists.")
             
     except sqlite3.Error as e:
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
         print(f"❌ Error during migration: {e}")
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
 
 if __name__ == "__main__":
     add_contacts_column()
@@ -0,0 +1,39 @@
+"""
+Database migration to make image filenames unique per property.
+
+Pasted images are now named after a hash of their content, and the
+uq_image_filename index is what lets a repeat paste of the same image resolve
+to the existing row instead of inserting a duplicate.
+"""
+from sqlalchemy import text
+from app.database import explicit_transaction
+
+def upgrade():
+    """Run the migration to add the property_images filename index."""
+    with explicit_transaction() as connection:
+        # Uploads used to be stored under the client's filename, so older
+        # databases can hold several rows for one file: each upload overwrote
+        # the last. Keep the newest row, carrying over the main flag if one of
+        # the removed rows had it, so the unique index below can be built.
+        duplicates = connection.execute(text(
+            "SELECT property_id, filename, MAX(id), MAX(is_main) FROM property_images "
+            "GROUP BY property_id, filename HAVING COUNT(*) > 1"
+        )).fetchall()
+        for property_id, filename, keep_id, had_main in duplicates:
+            connection.execute(text(
+                "DELETE FROM property_images "
+                "WHERE property_id = :property_id AND filename = :filename AND id != :keep_id"
+            ), {"property_id": property_id, "filename": filename, "keep_id": keep_id})
+            if had_main:
+                connection.execute(text(
+                    "UPDATE property_images SET is_main = 1 WHERE id = :keep_id"
+                ), {"keep_id": keep_id})
+
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_image_filename ON property_images (property_id, filename)"
+        ))
+    print(f"Migration completed: Removed {len(duplicates)} duplicate image filenames and added "
+          "uq_image_filename index to property_images table")
+
+if __name__ == "__main__":
+    upgrade()
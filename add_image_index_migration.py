@@ -0,0 +1,29 @@
+"""
+Database migration to index property_images by property and main-image flag.
+
+Existing databases were created before the ix_image_main and uq_image_main
+indexes were declared on the model, so main-image lookups fall back to a full
+scan of property_images and nothing stops a property having two main images.
+"""
+from sqlalchemy import text
+from app.database import explicit_transaction
+
+def upgrade():
+    """Run the migration to add the property_images composite index."""
+    with explicit_transaction() as connection:
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_image_main ON property_images (property_id, is_main)"
+        ))
+        # Older databases may hold several main images for a property; keep the
+        # newest one so the unique index below can be built
+        connection.execute(text(
+            "UPDATE property_images SET is_main = 0 WHERE is_main = 1 AND id NOT IN "
+            "(SELECT MAX(id) FROM property_images WHERE is_main = 1 GROUP BY property_id)"
+        ))
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_image_main ON property_images (property_id) WHERE is_main = 1"
+        ))
+    print("Migration completed: Added ix_image_main and uq_image_main indexes to property_images table")
+
+if __name__ == "__main__":
+    upgrade()
@@ -10,11 +10,13 @@ This migration adds the following fields to store image metadata:
 - original_format: Original format before optimization (if converted)
 """
 from sqlalchemy import text
-from app.database import engine
+from app.database import explicit_transaction
 
 def upgrade():
     """Run the migration to add image metadata fields."""
-    with engine.connect() as connection:
+    # Every ALTER runs inside one transaction, so a failure part way through
+    # leaves the table untouched and SQLite only commits once
+    with explicit_transaction() as connection:
         # SQLite doesn't support adding multiple columns in a single ALTER TABLE
         # So we'll execute separate ALTER TABLE statements for each column
         columns_to_add = [
@@ -28,13 +30,16 @@ def upgrade():
         
         # Check if columns exist before adding them
         cursor = connection.execute(text("PRAGMA table_info(property_images)"))
-        existing_columns = [row[1] for row in cursor.fetchall()]
+        existing_columns = {row[1] for row in cursor.fetchall()}
         
-        for column_name, column_type in columns_to_add:
-            if column_name not in existing_columns:
-                connection.execute(text(f"ALTER TABLE property_images ADD COLUMN {column_name} {column_type}"))
-        connection.commit()
-        print("Migration completed: Added image metadata fields to property_images table")
+        missing = [(name, col_type) for name, col_type in columns_to_add if name not in existing_columns]
+        if not missing:
+            print("Image metadata fields already exist. No migration needed.")
+            return
+        
+        for column_name, column_type in missing:
+            connection.execute(text(f"ALTER TABLE property_images ADD COLUMN {column_name} {column_type}"))
+    print("Migration completed: Added image metadata fields to property_images table")
 
 if __name__ == "__main__":
     upgrade()
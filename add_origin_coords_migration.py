@@ -0,0 +1,34 @@
+"""
+Database migration to add the geocoded origin to the settings table.
+
+This migration adds the following fields, filled in when the origin
+address is saved:
+- origin_lat: Latitude of the origin address
+- origin_lng: Longitude of the origin address
+"""
+from sqlalchemy import text
+from app.database import explicit_transaction
+
+def upgrade():
+    """Run the migration to add the origin coordinate fields."""
+    with explicit_transaction() as connection:
+        columns_to_add = [
+            ('origin_lat', 'FLOAT'),
+            ('origin_lng', 'FLOAT')
+        ]
+        
+        # Check if columns exist before adding them
+        cursor = connection.execute(text("PRAGMA table_info(settings)"))
+        existing_columns = {row[1] for row in cursor.fetchall()}
+        
+        missing = [(name, col_type) for name, col_type in columns_to_add if name not in existing_columns]
+        if not missing:
+            print("Origin coordinate fields already exist. No migration needed.")
+            return
+        
+        for column_name, column_type in missing:
+            connection.execute(text(f"ALTER TABLE settings ADD COLUMN {column_name} {column_type}"))
+    print("Migration completed: Added origin coordinate fields to settings table")
+
+if __name__ == "__main__":
+    upgrade()
@@ -1,13 +1,78 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # Create SQLite database engine
 SQLALCHEMY_DATABASE_URL = "sqlite:///./data/rentals.db"
 
+# Keep a small pool of long-lived connections so the SQLite page cache and
+# statement cache stay warm between requests instead of reopening the file
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=5,
+    max_overflow=10,
 )
+
+# Per-connection SQLite tuning: WAL lets readers run alongside a writer and
+# synchronous=NORMAL drops the fsync on every commit (still safe under WAL)
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # 64 MiB page cache
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256 MiB
+)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+@event.listens_for(engine, "connect")
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    # Not a tuning knob: SQLite only checks property_id references when this
+    # is on, so rows can't point at a deleted or missing property
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+@event.listens_for(engine, "close")
+def _optimize_on_close(dbapi_connection, connection_record):
+    # Let SQLite refresh its query planner statistics before the connection goes away
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA optimize")
+    cursor.close()
+
+
+@contextmanager
+def explicit_transaction():
+    """
+    Yield a connection whose statements, DDL included, run in one transaction.
+    
+    pysqlite's own transaction handling sends no BEGIN before CREATE, ALTER
+    or DROP, so under engine.begin() each of those commits on its own. Here
+    the driver is put in autocommit mode and BEGIN/COMMIT are sent directly.
+    """
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        connection.exec_driver_sql("BEGIN")
+        try:
+            yield connection
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
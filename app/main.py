@@ -1,41 +1,70 @@
 from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, JSONResponse
 import os
 import time
+import logging
+import fcntl
+from contextlib import asynccontextmanager
 from datetime import datetime
 from dotenv import load_dotenv
 from typing import Dict, Any
 
-from dotenv import load_dotenv
-
 # Load environment variables
 load_dotenv()
 
+# Configure logging once for the whole app; modules only create loggers
+logging.basicConfig(level=logging.INFO)
+
+# Read once at startup; .env doesn't change while the server is running
+GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY', '')
+
 from .database import engine, Base, get_db
 from sqlalchemy.orm import Session
 from .models import property as property_model
 from .models import settings as settings_model
+from .models import travel_cache as travel_cache_model
 from .routers import property as property_router
 from .routers import image as image_router
 from .routers import settings as settings_router
 from .routers import notes as notes_router
 from .routers import admin as admin_router
 from .routers import backup as backup_router
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from .services.property_cache import get_property_cached
+from .templating import templates
 
 # Application version
 APP_VERSION = "1.1.0"
 APP_START_TIME = time.time()
 
+INIT_LOCK_PATH = "data/.init.lock"
+
+def create_tables():
+    """Create any missing database tables, one worker at a time"""
+    os.makedirs(os.path.dirname(INIT_LOCK_PATH), exist_ok=True)
+    with open(INIT_LOCK_PATH, "w") as lock_file:
+        # Several uvicorn workers may start together against the same SQLite file
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            Base.metadata.create_all(bind=engine)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create database tables at startup instead of at import time"""
+    # Deployments that manage the schema with migrations can set RUN_CREATE_ALL=0
+    if os.getenv("RUN_CREATE_ALL", "1") == "1":
+        create_tables()
+    yield
+    image_router.shutdown_image_pool()
+
 # Create FastAPI app
 app = FastAPI(
     title="Rental Recon",
     version=APP_VERSION,
-    description="Property management and documentation system"
+    description="Property management and documentation system",
+    lifespan=lifespan
 )
 
 @app.get("/api/health", response_model=Dict[str, Any])
@@ -49,11 +78,23 @@ async def health_check():
         "service": "Rental Recon API"
     }
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+class CachedStaticFiles(StaticFiles):
+    """Static files that let browsers keep uploaded property images indefinitely"""
+    
+    # Uploaded images are saved under unique names and never rewritten in place
+    IMAGE_PREFIX = os.path.join("images", "")
+    IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+    
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        # The parent reuses the stat_result from the lookup for the ETag and
+        # Last-Modified headers, so no second stat() is needed here
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if self.get_path(scope).startswith(self.IMAGE_PREFIX):
+            response.headers["Cache-Control"] = self.IMAGE_CACHE_CONTROL
+        return response
 
-# Set up templates
-templates = Jinja2Templates(directory="app/templates")
+# Mount static files
+app.mount("/static", CachedStaticFiles(directory="app/static"), name="static")
 
 # Include routers
 app.include_router(property_router.router, prefix="/api/properties", tags=["properties"])
@@ -76,30 +117,29 @@ async def new_property(request: Request):
     """Render the new property form"""
     return templates.TemplateResponse("new_property.html", {"request": request})
 
-@app.get("/properties/{property_id}", response_class=HTMLResponse)
-async def view_property(request: Request, property_id: int, db: Session = Depends(get_db)):
-    """Render the property detail page"""
+def _render_property_detail(request: Request, property_id: int, db: Session):
+    """Render the property detail page, shared by both detail URLs"""
     # Check if property exists
-    property = db.query(property_model.Property).filter(property_model.Property.id == property_id).first()
+    property = get_property_cached(db, property_id)
     if not property:
         raise HTTPException(status_code=404, detail="Property not found")
     
-    # Load environment variables from .env
-    load_dotenv()
-    # Get Google Maps API key from .env
-    google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY', '')
-    
     return templates.TemplateResponse("property_detail.html", {
         "request": request,
         "property": property,
-        "google_maps_api_key": google_maps_api_key
+        "google_maps_api_key": GOOGLE_MAPS_API_KEY
     })
 
+@app.get("/properties/{property_id}", response_class=HTMLResponse)
+def view_property(request: Request, property_id: int, db: Session = Depends(get_db)):
+    """Render the property detail page"""
+    return _render_property_detail(request, property_id, db)
+
 @app.get("/properties/{property_id}/edit", response_class=HTMLResponse)
-async def edit_property(request: Request, property_id: int, db: Session = Depends(get_db)):
+def edit_property(request: Request, property_id: int, db: Session = Depends(get_db)):
     """Render the property edit form"""
     # Check if property exists
-    property = db.query(property_model.Property).filter(property_model.Property.id == property_id).first()
+    property = get_property_cached(db, property_id)
     if not property:
         raise HTTPException(status_code=404, detail="Property not found")
     
@@ -109,7 +149,7 @@ async def edit_property(request: Request, property_id: int, db: Session = Depend
     })
 
 @app.get("/properties", response_class=HTMLResponse)
-async def list_properties(request: Request, id: str = None, db: Session = Depends(get_db)):
+def list_properties(request: Request, id: str = None, db: Session = Depends(get_db)):
     """Render the property list page or property detail page if id is provided"""
     # If id parameter is provided, render property detail page (workaround for proxy issues)
     if id is not None and id.strip():
@@ -117,21 +157,7 @@ async def list_properties(request: Request, id: str = None, db: Session = Depend
             property_id = int(id)
         except (ValueError, TypeError):
             raise HTTPException(status_code=400, detail="Invalid property ID")
-        # Check if property exists
-        property = db.query(property_model.Property).filter(property_model.Property.id == property_id).first()
-        if not property:
-            raise HTTPException(status_code=404, detail="Property not found")
-        
-        # Load environment variables from .env
-        load_dotenv()
-        # Get Google Maps API key from .env
-        google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY', '')
-        
-        return templates.TemplateResponse("property_detail.html", {
-            "request": request,
-            "property": property,
-            "google_maps_api_key": google_maps_api_key
-        })
+        return _render_property_detail(request, property_id, db)
     
     # Otherwise render property list page
     return templates.TemplateResponse("property_list.html", {"request": request})
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Boolean, Column, Float, Integer, String, ForeignKey, Text, DateTime
+from sqlalchemy import Boolean, Column, Float, Integer, String, ForeignKey, Text, DateTime, Index, text
 from sqlalchemy.orm import relationship
 
 from ..database import Base
@@ -32,6 +32,14 @@ class Property(Base):
 
 class PropertyImage(Base):
     __tablename__ = "property_images"
+    __table_args__ = (
+        # Covers both "all images for a property" and the main-image lookup
+        Index("ix_image_main", "property_id", "is_main"),
+        # At most one main image per property, even with concurrent uploads
+        Index("uq_image_main", "property_id", unique=True, sqlite_where=text("is_main = 1")),
+        # Pasted images are named by content hash, so a repeat paste maps to the same row
+        Index("uq_image_filename", "property_id", "filename", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String)
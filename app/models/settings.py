@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Float, Integer, String
 from ..database import Base
 
 class Settings(Base):
@@ -6,3 +6,7 @@ class Settings(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     origin_address = Column(String, default="")
+    
+    # Geocoded once when the origin is saved, so lookups don't repeat it
+    origin_lat = Column(Float, nullable=True)
+    origin_lng = Column(Float, nullable=True)
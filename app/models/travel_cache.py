@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, String, JSON
+from ..database import Base
+
+class TravelTimeCache(Base):
+    __tablename__ = "travel_time_cache"
+
+    key = Column(String, primary_key=True)  # sha1 of the lookup arguments
+    payload = Column(JSON)  # calculate_travel_times() result
+    expires_at = Column(Integer, index=True)  # Unix timestamp
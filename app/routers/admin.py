@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from ..database import get_db, Base, engine
-from ..models.property import Property, PropertyImage, PropertyNote
-from ..models.settings import Settings
+from fastapi import APIRouter
+from ..database import Base, explicit_transaction
+# Imported so every table is registered on Base.metadata
+from ..models import property as property_model
+from ..models import settings as settings_model
+from ..models import travel_cache as travel_cache_model
+from ..services.property_cache import invalidate_property
+from ..services.settings_cache import invalidate_settings
 
 router = APIRouter(
     prefix="/admin",
@@ -10,17 +13,16 @@ router = APIRouter(
 )
 
 @router.post("/reset-database")
-def reset_database(db: Session = Depends(get_db)):
+def reset_database():
     """Clear all data from the database (testing purposes only)"""
-    # Delete all records from all tables
-    db.query(PropertyNote).delete()
-    db.query(PropertyImage).delete()
-    db.query(Property).delete()
-    db.query(Settings).delete()
-    db.commit()
+    # Dropping and recreating the tables inside one transaction frees the pages
+    # wholesale, so there is no need to DELETE every row first, and a failure
+    # part way through leaves every table in place
+    with explicit_transaction() as connection:
+        Base.metadata.drop_all(bind=connection)
+        Base.metadata.create_all(bind=connection)
     
-    # Recreate all tables (will keep the structure but remove all data)
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    invalidate_property()
+    invalidate_settings()
     
     return {"message": "Database has been reset successfully"}
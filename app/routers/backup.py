@@ -3,13 +3,11 @@ Backup management routes
 """
 from fastapi import APIRouter, Request, Form, HTTPException
 from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from typing import List
-import os
 from app.services.backup_service import BackupService
+from app.templating import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 # Initialize backup service
 backup_service = BackupService()
@@ -22,8 +20,8 @@ async def backup_page(request: Request):
     last_backup_time = backup_service.get_last_backup_time()
     
     backup_config = {
-        "backup_directory": os.path.abspath(backup_service.backup_dir),
-        "database_path": os.path.abspath(backup_service.db_path),
+        "backup_directory": backup_service.backup_dir_abs,
+        "database_path": backup_service.db_path_abs,
         "max_backups": config["max_backups"],
         "auto_backup": config["auto_backup"],
         "backup_interval": config["backup_interval"]
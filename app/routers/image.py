@@ -1,32 +1,146 @@
 import os
 import uuid
-import base64
+import hashlib
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
+import anyio
 from typing import List, Optional, Tuple
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, status
+from fastapi import APIRouter, Body, Depends, HTTPException, UploadFile, File, Form, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from pathlib import Path
 from ..database import get_db
-from ..models.property import Property, PropertyImage
+from ..models.property import PropertyImage
 from ..services.image_processor import ImageProcessor
+from ..services.property_cache import property_exists, invalidate_property
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+# orjson encodes the small response dicts here much faster than the stdlib json
+router = APIRouter(default_response_class=ORJSONResponse)
 
+# Absolute root for property image folders, resolved once at import
+IMAGE_ROOT = os.path.abspath("app/static/images")
+
+# ImageProcessor keeps no per-instance state, so one instance serves every request
+_IMAGE_PROCESSOR = ImageProcessor()
+
+# Longest "data:<mime>;base64," prefix searched for in pasted data URLs
+DATA_URL_HEADER_MAX = 64
+
+# Most files accepted by one batch upload; the worker pool bounds how many
+# are decoded at once, this bounds how many uploads a request can spool
+MAX_BATCH_IMAGES = 20
+
+# Worker processes for upload re-encodes, started on first use so that
+# importing the app (tests, migrations) doesn't spawn anything
+_IMG_POOL: Optional[ProcessPoolExecutor] = None
+
+# Caps paste re-encodes running at once in the threadpool at one per core;
+# created on first use because it has to be made inside the event loop
+_ENCODE_LIMITER: Optional[anyio.CapacityLimiter] = None
+
+
+def _init_image_worker():
+    """Load the Pillow format plugins once per worker instead of per image"""
+    from PIL import Image
+    Image.init()
+
+
+def _get_image_pool() -> ProcessPoolExecutor:
+    """Return the shared image worker pool, creating it if needed"""
+    global _IMG_POOL
+    if _IMG_POOL is None:
+        # spawn rather than fork: the server process has threads (threadpool,
+        # DB pool) whose locks must not be copied into the children
+        _IMG_POOL = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_image_worker
+        )
+    return _IMG_POOL
+
+
+async def _run_in_image_pool(fn, *args):
+    """Run fn in the image worker pool, replacing the pool once if it is broken"""
+    global _IMG_POOL
+    loop = asyncio.get_running_loop()
+    pool = _get_image_pool()
+    try:
+        return await loop.run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        # A worker died (on the Pi, usually the OOM killer) and the pool
+        # can't take work any more; another request may already have
+        # replaced it
+        logger.warning("Image worker pool broke, starting a new one")
+        if _IMG_POOL is pool:
+            _IMG_POOL = None
+            pool.shutdown(wait=False)
+        return await loop.run_in_executor(_get_image_pool(), fn, *args)
+
+
+def _get_encode_limiter() -> anyio.CapacityLimiter:
+    """Return the limiter for in-process image encodes, creating it if needed"""
+    global _ENCODE_LIMITER
+    if _ENCODE_LIMITER is None:
+        _ENCODE_LIMITER = anyio.CapacityLimiter(os.cpu_count() or 1)
+    return _ENCODE_LIMITER
+
+
+def shutdown_image_pool():
+    """Stop the image worker processes, if any were started"""
+    global _IMG_POOL
+    if _IMG_POOL is not None:
+        _IMG_POOL.shutdown()
+        _IMG_POOL = None
+
+
+def _strip_data_uri(data: str) -> str:
+    """Return the base64 payload of a data URL, or the string unchanged"""
+    # Only the short header is searched, never the multi-megabyte payload, and
+    # slicing past the comma avoids split() building a list around a copy
+    if data.startswith("data:"):
+        comma = data.find(',', 0, DATA_URL_HEADER_MAX)
+        if comma >= 0:
+            return data[comma + 1:]
+    return data
+
+
+def _write_file(path: str, data: bytes):
+    """Write bytes to path, replacing any existing file"""
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _unlink_quiet(path: str):
+    """Remove a file with a single syscall, ignoring it if already gone"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+@lru_cache(maxsize=4096)
 def ensure_image_dir(property_id: int) -> str:
     """
     Ensure the image directory exists for a property.
     
+    Cached per property, so the directory is only created on the first call;
+    call ensure_image_dir.cache_clear() after removing image directories.
+    
     Args:
         property_id: ID of the property
         
     Returns:
         Path to the image directory
     """
-    image_dir = os.path.abspath(f"app/static/images/property_{property_id}")
+    image_dir = os.path.join(IMAGE_ROOT, f"property_{property_id}")
     os.makedirs(image_dir, exist_ok=True)
     return image_dir
 
@@ -54,17 +168,15 @@ async def process_and_save_image(
     
     try:
         # Process and optimize the image
-        processed_image, new_filename, metadata = _process_uploaded_image(file, image_dir)
+        processed_image, new_filename, metadata = await _process_uploaded_image(file, image_dir)
         
-        # If this is the main image and there's an existing main image, update it
+        # If this is the main image, demote any existing main image with a single
+        # UPDATE that commits together with the new row below
         if is_main:
-            existing_main = db.query(PropertyImage).filter(
+            db.query(PropertyImage).filter(
                 PropertyImage.property_id == property_id,
                 PropertyImage.is_main == True
-            ).first()
-            if existing_main:
-                existing_main.is_main = False
-                db.commit()
+            ).update({"is_main": False}, synchronize_session=False)
         
         # Create image record in database with metadata
         db_image = PropertyImage(
@@ -78,9 +190,7 @@ async def process_and_save_image(
             is_optimized=metadata['is_optimized'],
             original_format=metadata['original_format']
         )
-        db.add(db_image)
-        db.commit()
-        db.refresh(db_image)
+        _insert_image(db, db_image)
         
         return db_image
         
@@ -88,13 +198,11 @@ async def process_and_save_image(
         logger.error(f"Error processing image: {str(e)}", exc_info=True)
         # Clean up any partially saved files
         if 'new_filename' in locals():
-            temp_path = os.path.join(image_dir, new_filename)
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            _unlink_quiet(os.path.join(image_dir, new_filename))
         raise
 
 
-def _process_uploaded_image(
+async def _process_uploaded_image(
     file: UploadFile,
     output_dir: str
 ) -> Tuple[bytes, str, dict]:
@@ -109,20 +217,33 @@ def _process_uploaded_image(
         Tuple of (processed_image_data, new_filename, metadata_dict)
     """
     try:
-        # Process the image using our ImageProcessor
-        image_processor = ImageProcessor()
+        # Read the spooled upload once; both paths below work on these bytes
+        await file.seek(0)
+        data = await file.read()
         
-        # Process the image and get metadata
-        # Remove 'await' as process_uploaded_file is not an async method
-        processed_data, new_filename, metadata = image_processor.process_uploaded_file(
-            file=file,
-            target_format='JPEG'  # Convert all to JPEG for consistency
+        # Small JPEGs that already fit are written to disk unchanged
+        metadata = _IMAGE_PROCESSOR.get_passthrough_metadata(data)
+        if metadata is not None:
+            new_filename = f"{uuid.uuid4().hex}.jpeg"
+            await run_in_threadpool(_write_file, os.path.join(output_dir, new_filename), data)
+            return data, new_filename, metadata
+        
+        # Re-encode in a worker process so concurrent uploads use every core
+        # instead of serializing on the GIL and the event loop
+        processed_data, new_filename, metadata = await _run_in_image_pool(
+            _IMAGE_PROCESSOR.process_image_data,
+            data,
+            file.filename,
+            'JPEG'  # Convert all to JPEG for consistency
         )
         
-        # Save the processed image
+        # Store under a unique name: uploads sharing a client filename must not
+        # overwrite each other, and image URLs are served as immutable
+        new_filename = f"{uuid.uuid4().hex}{Path(new_filename).suffix}"
+        
+        # Save the processed image without blocking the event loop
         output_path = os.path.join(output_dir, new_filename)
-        with open(output_path, 'wb') as f:
-            f.write(processed_data)
+        await run_in_threadpool(_write_file, output_path, processed_data)
             
         return processed_data, new_filename, metadata
         
@@ -131,6 +252,29 @@ def _process_uploaded_image(
         raise
 
 
+def _insert_image(db: Session, db_image: PropertyImage):
+    """
+    Insert and commit a new image row without reading it back.
+    
+    The flush fills in the id, and detaching the row before the commit keeps
+    the commit from expiring it, so reading its columns afterwards doesn't
+    cost another SELECT.
+    """
+    db.add(db_image)
+    db.flush()
+    db.expunge(db_image)
+    db.commit()
+    invalidate_property(db_image.property_id)
+
+
+def _find_image(db: Session, property_id: int, filename: str) -> Optional[PropertyImage]:
+    """Look up a property's image by filename"""
+    return db.query(PropertyImage).filter(
+        PropertyImage.property_id == property_id,
+        PropertyImage.filename == filename
+    ).first()
+
+
 @router.post("/{property_id}/upload", status_code=status.HTTP_201_CREATED)
 async def upload_image(
     property_id: int,
@@ -144,8 +288,7 @@ async def upload_image(
     Supports JPEG, PNG, and WEBP formats. Images are automatically optimized for web use.
     """
     # Check if property exists
-    db_property = db.query(Property).filter(Property.id == property_id).first()
-    if db_property is None:
+    if not property_exists(db, property_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Property not found"
@@ -174,6 +317,79 @@ async def upload_image(
         )
 
 
+@router.post("/{property_id}/upload/batch", status_code=status.HTTP_201_CREATED)
+async def upload_images(
+    property_id: int,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload and optimize several image files for a property at once.
+    
+    The files are processed concurrently across the image worker pool and
+    their rows are saved in one transaction. None of them becomes the main
+    image.
+    """
+    if len(files) > MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_IMAGES} images can be uploaded at once"
+        )
+    
+    # Check if property exists
+    if not property_exists(db, property_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Property not found"
+        )
+    
+    image_dir = ensure_image_dir(property_id)
+    results = await asyncio.gather(
+        *(_process_uploaded_image(file, image_dir) for file in files),
+        return_exceptions=True
+    )
+    
+    images, errors = [], {}
+    for file, result in zip(files, results):
+        if isinstance(result, Exception):
+            errors[file.filename] = str(result)
+            continue
+        _, new_filename, metadata = result
+        images.append(PropertyImage(
+            filename=new_filename,
+            is_main=False,
+            property_id=property_id,
+            width=metadata['width'],
+            height=metadata['height'],
+            format=metadata['format'],
+            size_kb=metadata['size_kb'],
+            is_optimized=metadata['is_optimized'],
+            original_format=metadata['original_format']
+        ))
+    
+    if images:
+        try:
+            db.add_all(images)
+            db.flush()
+            for db_image in images:
+                db.expunge(db_image)
+            db.commit()
+        except Exception:
+            db.rollback()
+            for db_image in images:
+                _unlink_quiet(os.path.join(image_dir, db_image.filename))
+            raise
+        invalidate_property(property_id)
+    
+    return {
+        "images": [
+            {"id": db_image.id, "filename": db_image.filename, "is_main": db_image.is_main}
+            for db_image in images
+        ],
+        "errors": errors
+    }
+
+
 @router.post("/{property_id}/paste", status_code=status.HTTP_201_CREATED)
 async def paste_image(
     property_id: int,
@@ -194,62 +410,77 @@ async def paste_image(
         )
     
     # Check if property exists
-    db_property = db.query(Property).filter(Property.id == property_id).first()
-    if db_property is None:
+    if not property_exists(db, property_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Property not found"
         )
     
-
-    
     try:
-        # Process the base64 image data and get metadata
-        image_processor = ImageProcessor()
-        processed_data, metadata = image_processor.process_base64_image(
-            data["image_data"],
-            target_format='JPEG'  # Convert to JPEG for consistency
+        # Process the base64 image data and get metadata; decoding and
+        # re-encoding are CPU-bound, so keep them off the event loop, and
+        # don't run more of them than there are cores
+        processed_data, metadata = await anyio.to_thread.run_sync(
+            partial(
+                _IMAGE_PROCESSOR.process_base64_image,
+                _strip_data_uri(data["image_data"]),
+                target_format='JPEG'  # Convert to JPEG for consistency
+            ),
+            limiter=_get_encode_limiter()
         )
         
-        # Generate a unique filename
-        filename = f"pasted_{uuid.uuid4().hex}.jpg"
-        
-        # Ensure the image directory exists
-        image_dir = ensure_image_dir(property_id)
-        
-        # Save the processed image
-        output_path = os.path.join(image_dir, filename)
-        with open(output_path, 'wb') as f:
-            f.write(processed_data)
+        # Name the file by its content so pasting the same image twice reuses
+        # the stored file and row instead of writing a duplicate
+        filename = f"pasted_{hashlib.sha256(processed_data).hexdigest()[:24]}.jpg"
         
-        # Create image record in database with metadata
-        db_image = PropertyImage(
-            filename=filename,
-            is_main=False,  # Pasted images are never main images by default
-            property_id=property_id,
-            width=metadata['width'],
-            height=metadata['height'],
-            format=metadata['format'],
-            size_kb=metadata['size_kb'],
-            is_optimized=metadata['is_optimized'],
-            original_format=metadata['original_format']
-        )
-        db.add(db_image)
-        db.commit()
-        db.refresh(db_image)
+        # A repeat paste resolves to the row already stored for it
+        row = _find_image(db, property_id, filename)
+        if row is None:
+            # Write the file before touching the database, so the write
+            # transaction is the single INSERT and nothing waits on the disk
+            # while it holds SQLite's write lock
+            output_path = os.path.join(ensure_image_dir(property_id), filename)
+            created = not os.path.exists(output_path)
+            if created:
+                await run_in_threadpool(_write_file, output_path, processed_data)
+            
+            db_image = PropertyImage(
+                filename=filename,
+                is_main=False,  # Pasted images are never main images by default
+                property_id=property_id,
+                width=metadata['width'],
+                height=metadata['height'],
+                format=metadata['format'],
+                size_kb=metadata['size_kb'],
+                is_optimized=metadata['is_optimized'],
+                original_format=metadata['original_format']
+            )
+            try:
+                _insert_image(db, db_image)
+                row = db_image
+            except IntegrityError:
+                # The same image was pasted concurrently; its row refers to
+                # this same content-named file, so the file stays
+                db.rollback()
+                row = _find_image(db, property_id, filename)
+                if row is None:
+                    raise
         
         return {
-            "id": db_image.id,
-            "filename": db_image.filename,
-            "is_main": db_image.is_main,
+            "id": row.id,
+            "filename": row.filename,
+            "is_main": row.is_main,
             "message": "Image pasted and optimized successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error pasting image: {str(e)}", exc_info=True)
-        # Clean up any partially saved files
-        if 'output_path' in locals() and os.path.exists(output_path):
-            os.remove(output_path)
+        # The row was not committed, so nothing refers to a file written here
+        db.rollback()
+        if locals().get('created'):
+            _unlink_quiet(output_path)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Error processing pasted image: {str(e)}"
@@ -264,21 +495,47 @@ def delete_image(
 ):
     """Delete an image for a property"""
     # Check if image exists and belongs to the property
-    db_image = db.query(PropertyImage).filter(
-        PropertyImage.id == image_id,
-        PropertyImage.property_id == property_id
-    ).first()
+    db_image = db.get(PropertyImage, image_id)
     
-    if db_image is None:
+    if db_image is None or db_image.property_id != property_id:
         raise HTTPException(status_code=404, detail="Image not found")
     
     # Delete the image file
-    image_path = f"app/static/images/property_{property_id}/{db_image.filename}"
-    if os.path.exists(image_path):
-        os.remove(image_path)
+    _unlink_quiet(os.path.join(ensure_image_dir(property_id), db_image.filename))
     
     # Delete image record from database
     db.delete(db_image)
     db.commit()
+    invalidate_property(property_id)
     
     return {"detail": "Image deleted"}
+
+
+@router.delete("/{property_id}/images")
+def delete_images(
+    property_id: int,
+    ids: List[int] = Body(..., embed=True),
+    db: Session = Depends(get_db)
+):
+    """Delete several images for a property in one request"""
+    # One SELECT for the filenames and one DELETE for the rows
+    images = db.query(PropertyImage.id, PropertyImage.filename).filter(
+        PropertyImage.property_id == property_id,
+        PropertyImage.id.in_(ids)
+    ).all()
+    if not images:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    deleted_ids = [image.id for image in images]
+    db.query(PropertyImage).filter(
+        PropertyImage.id.in_(deleted_ids)
+    ).delete(synchronize_session=False)
+    db.commit()
+    invalidate_property(property_id)
+    
+    # Remove the files once the rows are gone
+    image_dir = ensure_image_dir(property_id)
+    for image in images:
+        _unlink_quiet(os.path.join(image_dir, image.filename))
+    
+    return {"detail": "Images deleted", "deleted": deleted_ids}
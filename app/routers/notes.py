@@ -2,8 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, Body
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
-from ..models.property import Property, PropertyNote
+from ..models.property import PropertyNote
 from ..schemas.property import PropertyNote as PropertyNoteSchema, PropertyNoteCreate
+from ..services.property_cache import property_exists, invalidate_property
 
 router = APIRouter()
 
@@ -15,14 +16,14 @@ def add_note(
 ):
     """Add a note to a property"""
     # Check if property exists
-    db_property = db.query(Property).filter(Property.id == property_id).first()
-    if db_property is None:
+    if not property_exists(db, property_id):
         raise HTTPException(status_code=404, detail="Property not found")
     
     # Create note
     db_note = PropertyNote(**note.dict(), property_id=property_id)
     db.add(db_note)
     db.commit()
+    invalidate_property(property_id)
     db.refresh(db_note)
     return db_note
 
@@ -32,12 +33,13 @@ def get_property_notes(
     db: Session = Depends(get_db)
 ):
     """Get all notes for a property"""
-    # Check if property exists
-    db_property = db.query(Property).filter(Property.id == property_id).first()
-    if db_property is None:
+    notes = db.query(PropertyNote).filter(PropertyNote.property_id == property_id).all()
+    
+    # Only an empty result needs the existence check to tell "no notes" from 404
+    if not notes and not property_exists(db, property_id):
         raise HTTPException(status_code=404, detail="Property not found")
     
-    return db_property.notes
+    return notes
 
 @router.delete("/{property_id}/notes/{note_id}")
 def delete_note(
@@ -47,15 +49,13 @@ def delete_note(
 ):
     """Delete a note from a property"""
     # Check if note exists and belongs to the property
-    db_note = db.query(PropertyNote).filter(
-        PropertyNote.id == note_id,
-        PropertyNote.property_id == property_id
-    ).first()
+    db_note = db.get(PropertyNote, note_id)
     
-    if db_note is None:
+    if db_note is None or db_note.property_id != property_id:
         raise HTTPException(status_code=404, detail="Note not found")
     
     db.delete(db_note)
     db.commit()
+    invalidate_property(property_id)
     
     return {"detail": "Note deleted"}
@@ -1,16 +1,88 @@
 import os
+import uuid
 import shutil
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body, Request, Response
+from datetime import datetime
+from sqlalchemy import Float, select, update
+from sqlalchemy.orm import Session, raiseload, selectinload
+from typing import List, Optional, Tuple
 from ..database import get_db
-from ..models.property import Property, PropertyImage
-from ..models.settings import Settings
+from ..models.property import Property, PropertyImage, PropertyNote
 from ..schemas.property import PropertyCreate, Property as PropertySchema
 from ..services.travel_time import TravelTimeService
+from ..services.property_cache import invalidate_property, get_property_api_cached, store_property_api
+from ..services.settings_cache import get_settings_cached, origin_coords
+from .image import IMAGE_ROOT, ensure_image_dir, _unlink_quiet
 
 router = APIRouter()
 
+# Uploads are copied in 1 MiB chunks rather than copyfileobj's 64 KiB default
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Property columns written by a travel time calculation
+TRAVEL_TIME_FIELDS = (
+    "travel_time_830am",
+    "travel_time_930am",
+    "travel_time_midday",
+    "travel_time_630pm",
+    "travel_time_730pm",
+)
+
+# Travel time result entries that are returned to the client but not stored
+TRAVEL_EXTRA_SUFFIXES = ("_display", "_anomaly", "_note")
+
+# Concurrent Distance Matrix lookups per batch request
+TRAVEL_BATCH_WORKERS = 8
+
+# Columns _update_property_row casts back to float
+PROPERTY_FLOAT_COLUMNS = tuple(
+    column.name for column in Property.__table__.c if isinstance(column.type, Float)
+)
+
+def _save_main_image(directory: str, upload: UploadFile) -> str:
+    """Save an uploaded main image in directory under a unique name and return the filename"""
+    file_extension = upload.filename.split('.')[-1]
+    unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
+    file_path = os.path.join(directory, unique_filename)
+    
+    # Copied in chunks straight from the spooled upload, never read whole into
+    # memory. Anything that forwards an upload elsewhere should do the same and
+    # hand the file object to the HTTP client (requests.post(url, data=upload.file))
+    # rather than a read() of it.
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer, UPLOAD_CHUNK_SIZE)
+    return unique_filename
+
+
+def _update_property_row(db: Session, property_id: int, values: dict) -> Optional[dict]:
+    """
+    Write values to a property row and return the whole row as a dict.
+    
+    A single UPDATE ... RETURNING replaces the load, per-attribute change
+    tracking and post-commit refresh of the ORM path. The caller commits.
+    
+    Returns:
+        The updated row, or None if the property doesn't exist
+    """
+    table = Property.__table__
+    if values:
+        stmt = update(table).where(table.c.id == property_id).values(**values).returning(*table.c)
+    else:
+        stmt = select(table).where(table.c.id == property_id)
+    row = db.execute(stmt).first()
+    if row is None:
+        return None
+    
+    # Core rows carry the raw SQLite values, so whole numbers stored in Float
+    # columns come back as int; cast them the way the ORM path returned them
+    values = dict(row._mapping)
+    for name in PROPERTY_FLOAT_COLUMNS:
+        if values[name] is not None:
+            values[name] = float(values[name])
+    return values
+
+
 @router.post("/", response_model=PropertySchema)
 def create_property(
     address: str = Form(...),
@@ -38,74 +110,93 @@ def create_property(
         "contacts": contacts
     }
     
-    db_property = Property(**property_data)
-    db.add(db_property)
-    db.commit()
-    db.refresh(db_property)
-    
-    # Handle main image upload
-    if main_image and main_image.filename:
-        # Create property-specific images directory
-        property_image_dir = f"app/static/images/property_{db_property.id}"
-        os.makedirs(property_image_dir, exist_ok=True)
-        
-        # Generate unique filename
-        import uuid
-        file_extension = main_image.filename.split('.')[-1]
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = f"{property_image_dir}/{unique_filename}"
-        
-        # Save the file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(main_image.file, buffer)
-        
-        # Create PropertyImage record
-        db_image = PropertyImage(
-            filename=unique_filename,
-            is_main=True,
-            property_id=db_property.id
-        )
-        db.add(db_image)
-        db.commit()
-    
-    # Auto-calculate travel times if origin address is set
+    # Auto-calculate travel times if origin address is set. This runs before
+    # the insert so no write transaction is held open across the API calls.
     try:
-        settings = db.query(Settings).first()
-        if settings and settings.origin_address:
+        settings = get_settings_cached(db)
+        if settings and settings["origin_address"]:
             travel_service = TravelTimeService()
             travel_times = travel_service.calculate_travel_times(
-                origin=settings.origin_address,
-                destination=address
+                origin=settings["origin_address"],
+                destination=address,
+                origin_coords=origin_coords(settings)
             )
-            
-            # Update property with calculated travel times
-            for time_key, time_value in travel_times.items():
-                if time_value is not None:
-                    setattr(db_property, time_key, time_value)
-            
-            db.commit()
-            db.refresh(db_property)
+            property_data.update({key: travel_times.get(key) for key in TRAVEL_TIME_FIELDS})
     except Exception as e:
         # Log error but don't fail property creation
         print(f"Warning: Could not calculate travel times: {e}")
     
-    return db_property
+    # Copy the main image before the insert so SQLite's write lock isn't held
+    # across the copy. The property's folder is named after its id, so the
+    # file waits in the image root until the flush has assigned one.
+    filename = None
+    if main_image and main_image.filename:
+        os.makedirs(IMAGE_ROOT, exist_ok=True)
+        filename = _save_main_image(IMAGE_ROOT, main_image)
+    file_path = filename and os.path.join(IMAGE_ROOT, filename)
+    
+    # The property and its main image go in one transaction (one commit, so
+    # one fsync)
+    try:
+        db_property = Property(**property_data)
+        db.add(db_property)
+        db.flush()
+        
+        if filename:
+            target = os.path.join(ensure_image_dir(db_property.id), filename)
+            os.replace(file_path, target)
+            file_path = target
+            db.add(PropertyImage(
+                filename=filename,
+                is_main=True,
+                property_id=db_property.id
+            ))
+            db.flush()
+        
+        response = PropertySchema.model_validate(db_property, from_attributes=True)
+        db.commit()
+    except Exception:
+        # No row refers to the file unless the commit went through
+        db.rollback()
+        if file_path:
+            _unlink_quiet(file_path)
+        raise
+    return response
 
 
 @router.get("/", response_model=List[PropertySchema])
 def read_properties(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all property listings"""
-    properties = db.query(Property).offset(skip).limit(limit).all()
+    # Load every row's images and notes in one IN query each instead of
+    # lazily per property while the response is serialized
+    properties = db.query(Property).options(
+        selectinload(Property.images),
+        selectinload(Property.notes)
+    ).offset(skip).limit(limit).all()
     return properties
 
 
 @router.get("/{property_id}", response_model=PropertySchema)
-def read_property(property_id: int, db: Session = Depends(get_db)):
+def read_property(property_id: int, request: Request, db: Session = Depends(get_db)):
     """Get a specific property by ID"""
-    db_property = db.query(Property).filter(Property.id == property_id).first()
-    if db_property is None:
-        raise HTTPException(status_code=404, detail="Property not found")
-    return db_property
+    # Serve the serialized response from memory while it's fresh; any write to
+    # the property, its images or its notes invalidates it
+    cached = get_property_api_cached(property_id)
+    if cached is None:
+        db_property = db.get(Property, property_id, options=[
+            selectinload(Property.images),
+            selectinload(Property.notes),
+            raiseload("*")
+        ])
+        if db_property is None:
+            raise HTTPException(status_code=404, detail="Property not found")
+        cached = store_property_api(property_id, PropertySchema.model_validate(db_property, from_attributes=True).model_dump_json().encode())
+    
+    etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.put("/{property_id}", response_model=PropertySchema)
@@ -125,7 +216,7 @@ def update_property(
     db: Session = Depends(get_db)
 ):
     """Update a property listing"""
-    db_property = db.query(Property).filter(Property.id == property_id).first()
+    db_property = db.get(Property, property_id)
     if db_property is None:
         raise HTTPException(status_code=404, detail="Property not found")
     
@@ -141,56 +232,55 @@ def update_property(
     db_property.on_premises_parking = on_premises_parking
     
     # Handle main image updates
+    new_filename = None
     if main_image and main_image.filename:
-        # Remove existing main image
-        existing_main = db.query(PropertyImage).filter(
-            PropertyImage.property_id == property_id,
-            PropertyImage.is_main == True
-        ).first()
-        if existing_main:
-            # Delete the old file
-            old_file_path = f"app/static/images/{existing_main.filename}"
-            if os.path.exists(old_file_path):
-                os.remove(old_file_path)
-            db.delete(existing_main)
-        
-        # Create property-specific images directory
-        property_image_dir = f"app/static/images/property_{property_id}"
-        os.makedirs(property_image_dir, exist_ok=True)
-        
-        # Generate unique filename
-        import uuid
-        file_extension = main_image.filename.split('.')[-1]
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = f"{property_image_dir}/{unique_filename}"
-        
-        # Save the new file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(main_image.file, buffer)
+        new_filename = _save_main_image(ensure_image_dir(property_id), main_image)
+    
+    try:
+        if new_filename:
+            # Remove existing main image
+            existing_main = db.query(PropertyImage).filter(
+                PropertyImage.property_id == property_id,
+                PropertyImage.is_main == True
+            ).first()
+            if existing_main:
+                # Delete the old file
+                _unlink_quiet(os.path.join(ensure_image_dir(property_id), existing_main.filename))
+                db.delete(existing_main)
+                # Delete before inserting the new main image (uq_image_main)
+                db.flush()
         
-        # Create new PropertyImage record
-        db_image = PropertyImage(
-            filename=unique_filename,
-            is_main=True,
-            property_id=property_id
-        )
-        db.add(db_image)
-    elif keep_main_image != "true":
-        # User wants to remove main image (no new image and not keeping existing)
-        existing_main = db.query(PropertyImage).filter(
-            PropertyImage.property_id == property_id,
-            PropertyImage.is_main == True
-        ).first()
-        if existing_main:
-            # Delete the old file
-            old_file_path = f"app/static/images/{existing_main.filename}"
-            if os.path.exists(old_file_path):
-                os.remove(old_file_path)
-            db.delete(existing_main)
+            # Create new PropertyImage record
+            db_image = PropertyImage(
+                filename=new_filename,
+                is_main=True,
+                property_id=property_id
+            )
+            db.add(db_image)
+        elif keep_main_image != "true":
+            # User wants to remove main image (no new image and not keeping existing)
+            existing_main = db.query(PropertyImage).filter(
+                PropertyImage.property_id == property_id,
+                PropertyImage.is_main == True
+            ).first()
+            if existing_main:
+                # Delete the old file
+                _unlink_quiet(os.path.join(ensure_image_dir(property_id), existing_main.filename))
+                db.delete(existing_main)
     
-    db.commit()
-    db.refresh(db_property)
-    return db_property
+        # Build the response from the flushed state instead of refreshing the
+        # row after the commit expires it; nothing is filled in server-side
+        db.flush()
+        response = PropertySchema.model_validate(db_property, from_attributes=True)
+        db.commit()
+    except Exception:
+        # No row refers to the new file unless the commit went through
+        db.rollback()
+        if new_filename:
+            _unlink_quiet(os.path.join(ensure_image_dir(property_id), new_filename))
+        raise
+    invalidate_property(property_id)
+    return response
 
 
 @router.patch("/{property_id}")
@@ -205,30 +295,122 @@ def update_property_partial(
     db: Session = Depends(get_db)
 ):
     """Update property travel times"""
-    # Get property
-    db_property = db.query(Property).filter(Property.id == property_id).first()
-    if db_property is None:
+    # Only the fields that were supplied are written
+    updates = {
+        key: value for key, value in (
+            ("travel_time_830am", travel_time_830am),
+            ("travel_time_930am", travel_time_930am),
+            ("travel_time_midday", travel_time_midday),
+            ("travel_time_630pm", travel_time_630pm),
+            ("travel_time_730pm", travel_time_730pm),
+            ("contacts", contacts),
+        ) if value is not None
+    }
+    
+    row = _update_property_row(db, property_id, updates)
+    if row is None:
         raise HTTPException(status_code=404, detail="Property not found")
     
-    # Update travel times if provided
-    if travel_time_830am is not None:
-        db_property.travel_time_830am = travel_time_830am
-    if travel_time_930am is not None:
-        db_property.travel_time_930am = travel_time_930am
-    if travel_time_midday is not None:
-        db_property.travel_time_midday = travel_time_midday
-    if travel_time_630pm is not None:
-        db_property.travel_time_630pm = travel_time_630pm
-    if travel_time_730pm is not None:
-        db_property.travel_time_730pm = travel_time_730pm
+    db.commit()
+    invalidate_property(property_id)
+    return row
+
+
+def _split_travel_times(travel_times: dict) -> Tuple[dict, List[str]]:
+    """
+    Pick the response-only entries and the flagged anomaly keys out of a
+    travel time result in a single pass.
     
-    # Update contacts if provided
-    if contacts is not None:
-        db_property.contacts = contacts
+    Returns:
+        Tuple of (display/anomaly/note entries, keys of anomalies that are set)
+    """
+    extras, anomalies = {}, []
+    for key, value in travel_times.items():
+        if key.endswith(TRAVEL_EXTRA_SUFFIXES):
+            extras[key] = value
+            if value and key.endswith('_anomaly'):
+                anomalies.append(key)
+    return extras, anomalies
+
+
+def _anomaly_note(property_id: int, travel_times: dict, anomalies: List[str]) -> Optional[PropertyNote]:
+    """Build a note describing the given travel time anomalies, or None if there are none"""
+    if not anomalies:
+        return None
     
-    db.commit()
-    db.refresh(db_property)
-    return db_property
+    note_content = f"Travel time anomalies detected on {travel_times.get('calculation_day', 'calculation day')}. "
+    for key in anomalies:
+        time_key = key.replace('_anomaly', '')
+        note_content += f"{time_key}: {travel_times.get(f'{time_key}_note', 'Unusual traffic pattern')}. "
+    
+    return PropertyNote(
+        property_id=property_id,
+        content=note_content,
+        created_at=datetime.utcnow()
+    )
+
+
+@router.post("/calculate-travel-times/batch")
+def calculate_travel_times_batch(
+    ids: List[int] = Body(..., embed=True),
+    use_tuesday: bool = False,
+    day_offset: int = 0,
+    db: Session = Depends(get_db)
+):
+    """
+    Calculate travel times for several properties at once.
+    
+    The lookups run concurrently, and every property is written in one
+    transaction.
+    
+    Args:
+        ids: Property IDs
+        use_tuesday: If True, use Tuesday instead of Monday (default: False)
+        day_offset: Days to add/subtract from the target date (default: 0)
+    """
+    settings = get_settings_cached(db)
+    if not settings or not settings["origin_address"]:
+        raise HTTPException(status_code=400, detail="Global origin address not set")
+    
+    properties = db.query(Property.id, Property.address).filter(Property.id.in_(ids)).all()
+    if not properties:
+        raise HTTPException(status_code=404, detail="Property not found")
+    
+    travel_time_service = TravelTimeService()
+    
+    def lookup(db_property):
+        return travel_time_service.calculate_travel_times(
+            origin=settings["origin_address"],
+            destination=db_property.address,
+            use_tuesday=use_tuesday,
+            day_offset=day_offset,
+            origin_coords=origin_coords(settings)
+        )
+    
+    # The lookups are network-bound, so threads overlap their latency
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=min(TRAVEL_BATCH_WORKERS, len(properties))) as pool:
+        futures = {db_property.id: pool.submit(lookup, db_property) for db_property in properties}
+        for property_id, future in futures.items():
+            try:
+                results[property_id] = future.result()
+            except Exception as e:
+                errors[property_id] = str(e)
+    
+    if results:
+        db.execute(update(Property), [
+            {"id": property_id, **{key: travel_times.get(key) for key in TRAVEL_TIME_FIELDS}}
+            for property_id, travel_times in results.items()
+        ])
+        for property_id, travel_times in results.items():
+            note = _anomaly_note(property_id, travel_times, _split_travel_times(travel_times)[1])
+            if note is not None:
+                db.add(note)
+        db.commit()
+        for property_id in results:
+            invalidate_property(property_id)
+    
+    return {"results": results, "errors": errors}
 
 
 @router.post("/{property_id}/calculate-travel-times")
@@ -246,80 +428,47 @@ def calculate_travel_times(
         use_tuesday: If True, use Tuesday instead of Monday (default: False)
         day_offset: Days to add/subtract from the target date (default: 0)
     """
-    # Get property
-    db_property = db.query(Property).filter(Property.id == property_id).first()
-    if not db_property:
+    # Only the address is needed; the full row comes back from the UPDATE
+    db_property = db.query(Property.address).filter(Property.id == property_id).first()
+    if db_property is None:
         raise HTTPException(status_code=404, detail="Property not found")
     
     # Get global origin address from settings
-    settings = db.query(Settings).first()
-    if not settings or not settings.origin_address:
+    settings = get_settings_cached(db)
+    if not settings or not settings["origin_address"]:
         raise HTTPException(status_code=400, detail="Global origin address not set")
     
     # Calculate travel times
     travel_time_service = TravelTimeService()
     try:
         travel_times = travel_time_service.calculate_travel_times(
-            origin=settings.origin_address,
+            origin=settings["origin_address"],
             destination=db_property.address,
             use_tuesday=use_tuesday,
-            day_offset=day_offset
+            day_offset=day_offset,
+            origin_coords=origin_coords(settings)
         )
         
         # Update property with travel times
-        property_data = {
-            "travel_time_830am": travel_times.get("travel_time_830am"),
-            "travel_time_930am": travel_times.get("travel_time_930am"),
-            "travel_time_midday": travel_times.get("travel_time_midday"),
-            "travel_time_630pm": travel_times.get("travel_time_630pm"),
-            "travel_time_730pm": travel_times.get("travel_time_730pm")
-        }
+        property_data = {key: travel_times.get(key) for key in TRAVEL_TIME_FIELDS}
         
         # Store metadata in property notes if anomalies detected
-        anomalies = [key for key in travel_times.keys() if key.endswith('_anomaly') and travel_times[key]]
-        if anomalies:
-            note_content = f"Travel time anomalies detected on {travel_times.get('calculation_day', 'calculation day')}. "
-            for key in anomalies:
-                time_key = key.replace('_anomaly', '')
-                note_content += f"{time_key}: {travel_times.get(f'{time_key}_note', 'Unusual traffic pattern')}. "
-            
-            # Add a note to the property
-            note = PropertyNote(
-                property_id=property_id,
-                content=note_content,
-                created_at=datetime.utcnow()
-            )
+        extras, anomalies = _split_travel_times(travel_times)
+        note = _anomaly_note(property_id, travel_times, anomalies)
+        if note is not None:
             db.add(note)
-            db.commit()
         
-        # Update property with travel times
-        for key, value in property_data.items():
-            setattr(db_property, key, value)
+        # Update property with travel times; the note (if any) commits with it
+        response = _update_property_row(db, property_id, property_data)
         db.commit()
-        db.refresh(db_property)
-        
-        # Create a response dictionary with property data
-        response = db_property.__dict__.copy()
-        
-        # Remove SQLAlchemy state attributes
-        if '_sa_instance_state' in response:
-            del response['_sa_instance_state']
+        invalidate_property(property_id)
         
-        # Add display formats to the response (won't be saved in DB)
-        for key in ['travel_time_830am', 'travel_time_930am', 'travel_time_midday', 'travel_time_630pm', 'travel_time_730pm']:
-            display_key = f"{key}_display"
-            if display_key in travel_times:
-                response[display_key] = travel_times[display_key]
-        
-        # Add calculation metadata
+        # Add display formats and anomaly flags to the response (won't be
+        # saved in DB), plus calculation metadata
+        response.update(extras)
         response['calculation_day'] = travel_times.get('calculation_day', 'next Monday')
         response['calculation_timestamp'] = travel_times.get('calculation_timestamp')
         
-        # Add anomaly flags if any
-        for key in travel_times:
-            if key.endswith('_anomaly') or key.endswith('_note'):
-                response[key] = travel_times[key]
-        
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -328,15 +477,15 @@ def calculate_travel_times(
 @router.delete("/{property_id}")
 def delete_property(property_id: int, db: Session = Depends(get_db)):
     """Delete a property listing"""
-    db_property = db.query(Property).filter(Property.id == property_id).first()
+    db_property = db.get(Property, property_id)
     if db_property is None:
         raise HTTPException(status_code=404, detail="Property not found")
     
     # Delete associated images first
-    image_dir = f"app/static/images/property_{property_id}"
-    if os.path.exists(image_dir):
-        shutil.rmtree(image_dir)
+    shutil.rmtree(os.path.join(IMAGE_ROOT, f"property_{property_id}"), ignore_errors=True)
+    ensure_image_dir.cache_clear()
     
     db.delete(db_property)
     db.commit()
+    invalidate_property(property_id)
     return {"detail": "Property deleted"}
@@ -4,32 +4,31 @@ from typing import Optional
 from ..database import get_db
 from ..models.settings import Settings
 from ..schemas.settings import Settings as SettingsSchema, SettingsUpdate
+from ..services.settings_cache import get_settings_cached, cache_settings
+from ..services.travel_time import TravelTimeService
 
 router = APIRouter()
 
-@router.get("/", response_model=SettingsSchema)
-def get_settings(db: Session = Depends(get_db)):
-    """Get global settings including origin address"""
-    # Get the first settings record or create one if it doesn't exist
-    settings = db.query(Settings).first()
+def _get_or_create_settings(db: Session):
+    """Get the first settings record or create one if it doesn't exist"""
+    settings = get_settings_cached(db)
     if settings is None:
-        settings = Settings(origin_address="")
-        db.add(settings)
+        db_settings = Settings(origin_address="")
+        db.add(db_settings)
         db.commit()
-        db.refresh(settings)
+        db.refresh(db_settings)
+        settings = cache_settings(db_settings)
     return settings
 
+@router.get("/", response_model=SettingsSchema)
+def get_settings(db: Session = Depends(get_db)):
+    """Get global settings including origin address"""
+    return _get_or_create_settings(db)
+
 @router.get("/origin", response_model=SettingsSchema)
 def get_origin_address(db: Session = Depends(get_db)):
     """Get origin address setting (convenience endpoint)"""
-    # Get the first settings record or create one if it doesn't exist
-    settings = db.query(Settings).first()
-    if settings is None:
-        settings = Settings(origin_address="")
-        db.add(settings)
-        db.commit()
-        db.refresh(settings)
-    return settings
+    return _get_or_create_settings(db)
 
 @router.put("/", response_model=SettingsSchema)
 def update_settings(origin_address: str = Form(...), db: Session = Depends(get_db)):
@@ -38,8 +37,15 @@ def update_settings(origin_address: str = Form(...), db: Session = Depends(get_d
     if settings is None:
         settings = Settings(origin_address=origin_address)
         db.add(settings)
+    elif settings.origin_address == origin_address and settings.origin_lat is not None:
+        # Unchanged and already geocoded
+        return cache_settings(settings)
     else:
         settings.origin_address = origin_address
+    
+    # Geocode the origin here, once, rather than on every travel time lookup
+    coords = TravelTimeService().geocode(origin_address) if origin_address else None
+    settings.origin_lat, settings.origin_lng = coords if coords else (None, None)
     db.commit()
     db.refresh(settings)
-    return settings
+    return cache_settings(settings)
@@ -2,19 +2,66 @@
 Backup service for database management
 """
 import os
-import shutil
 import sqlite3
+import time
+from collections import deque
+from contextlib import closing
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional
 import json
 from pathlib import Path
 
+# Backup files are named rentals_backup_<YYYYmmdd_HHMMSS>.db
+_BACKUP_PREFIX = "rentals_backup_"
+_BACKUP_SUFFIX = ".db"
+
+
+def _is_backup(filename: str) -> bool:
+    """Check a filename looks like one of our backup files"""
+    return filename.startswith(_BACKUP_PREFIX) and filename.endswith(_BACKUP_SUFFIX)
+
+
 class BackupService:
+    # Seconds that file listings are reused before re-scanning the directory
+    CACHE_TTL = 5
+    
     def __init__(self, db_path: str = "data/rentals.db", backup_dir: str = "backups"):
         self.db_path = db_path
         self.backup_dir = backup_dir
         self.config_file = os.path.join(backup_dir, "backup_config.json")
+        # Resolved once; the working directory doesn't change at runtime
+        self.backup_dir_abs = os.path.abspath(backup_dir)
+        self.db_path_abs = os.path.abspath(db_path)
+        self._cache: Dict[str, tuple] = {}
+        # Parsed config plus the (mtime, size) of the file it was read from
+        self._config: Optional[Dict] = None
+        self._config_stamp: Optional[tuple] = None
+        # Backup filenames oldest first; read from disk once, then kept up to
+        # date by create_backup, cleanup_old_backups and delete_backup_files
+        self._backup_names: Optional[deque] = None
         self.ensure_backup_directory()
+    
+    def _cached(self, key: str, loader: Callable[[], Any]) -> Any:
+        """Return a cached value for key, reloading it once CACHE_TTL has passed"""
+        entry = self._cache.get(key)
+        now = time.monotonic()
+        if entry is not None and now - entry[0] < self.CACHE_TTL:
+            return entry[1]
+        value = loader()
+        self._cache[key] = (now, value)
+        return value
+    
+    def invalidate_cache(self):
+        """Forget cached file listings after anything on disk changes"""
+        self._cache.clear()
+    
+    def _config_file_stamp(self) -> Optional[tuple]:
+        """Return (mtime, size) of the config file, or None if it doesn't exist"""
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
         
     def ensure_backup_directory(self):
         """Ensure backup directory exists"""
@@ -22,6 +69,16 @@ class BackupService:
         
     def get_backup_config(self) -> Dict:
         """Get backup configuration"""
+        # Re-parse only when the file has changed, including edits made by hand
+        stamp = self._config_file_stamp()
+        if self._config is None or stamp != self._config_stamp:
+            self._config = self._load_backup_config()
+            self._config_stamp = stamp
+        # Hand out a copy so callers can modify it before save_backup_config
+        return dict(self._config)
+    
+    def _load_backup_config(self) -> Dict:
+        """Read backup configuration from disk"""
         default_config = {
             "max_backups": 7,
             "auto_backup": True,
@@ -44,6 +101,8 @@ class BackupService:
         """Save backup configuration"""
         with open(self.config_file, 'w') as f:
             json.dump(config, f, indent=2)
+        self._config = dict(config)
+        self._config_stamp = self._config_file_stamp()
     
     def update_max_backups(self, max_backups: int) -> bool:
         """Update maximum number of backups to keep"""
@@ -66,11 +125,20 @@ class BackupService:
         try:
             # Generate backup filename with timestamp
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_filename = f"rentals_backup_{timestamp}.db"
+            backup_filename = f"{_BACKUP_PREFIX}{timestamp}{_BACKUP_SUFFIX}"
             backup_path = os.path.join(self.backup_dir, backup_filename)
+            # Load the name list before the new file exists so it isn't counted twice
+            names = self._names()
             
-            # Copy the database file
-            shutil.copy2(self.db_path, backup_path)
+            # Copy through SQLite's online backup API: it includes changes still
+            # in the WAL file, which a plain file copy would miss, and gives a
+            # consistent snapshot while the app keeps writing
+            with closing(sqlite3.connect(self.db_path)) as source, \
+                    closing(sqlite3.connect(backup_path)) as target:
+                source.backup(target)
+            if not names or names[-1] != backup_filename:
+                names.append(backup_filename)
+            self.invalidate_cache()
             
             # Update last backup time in config
             config = self.get_backup_config()
@@ -91,27 +159,50 @@ class BackupService:
     
     def get_backup_files(self) -> List[Dict]:
         """Get list of backup files with metadata"""
+        return list(self._cached("files", self._load_backup_files))
+    
+    def _list_backup_names(self) -> List[str]:
+        """List backup filenames, newest first, without stat'ing any of them"""
+        if not os.path.exists(self.backup_dir):
+            return []
+        
+        with os.scandir(self.backup_dir) as entries:
+            names = [entry.name for entry in entries if _is_backup(entry.name)]
+        
+        # Names embed a %Y%m%d_%H%M%S timestamp, so name order is age order
+        names.sort(reverse=True)
+        return names
+    
+    def _names(self) -> deque:
+        """Return the tracked backup filenames, oldest first"""
+        if self._backup_names is None:
+            self._backup_names = deque(reversed(self._list_backup_names()))
+        return self._backup_names
+    
+    def _forget_backup(self, filename: str):
+        """Stop tracking a backup that was deleted"""
+        try:
+            self._names().remove(filename)
+        except ValueError:
+            pass
+    
+    def _load_backup_files(self) -> List[Dict]:
+        """Scan the backup directory for backup files"""
         backups = []
         
-        if not os.path.exists(self.backup_dir):
-            return backups
-            
-        for filename in os.listdir(self.backup_dir):
-            if filename.startswith("rentals_backup_") and filename.endswith(".db"):
-                filepath = os.path.join(self.backup_dir, filename)
-                try:
-                    stat = os.stat(filepath)
-                    backups.append({
-                        "filename": filename,
-                        "size": stat.st_size,
-                        "created": datetime.fromtimestamp(stat.st_mtime),
-                        "size_mb": round(stat.st_size / (1024 * 1024), 2)
-                    })
-                except OSError:
-                    continue
+        # Only the listing shown in the UI needs sizes and times
+        for filename in self._list_backup_names():
+            try:
+                stat = os.stat(os.path.join(self.backup_dir, filename))
+                backups.append({
+                    "filename": filename,
+                    "size": stat.st_size,
+                    "created": datetime.fromtimestamp(stat.st_mtime),
+                    "size_mb": round(stat.st_size / (1024 * 1024), 2)
+                })
+            except OSError:
+                continue
         
-        # Sort by creation time, newest first
-        backups.sort(key=lambda x: x["created"], reverse=True)
         return backups
     
     def cleanup_old_backups(self, max_backups: Optional[int] = None):
@@ -120,16 +211,16 @@ class BackupService:
             config = self.get_backup_config()
             max_backups = config["max_backups"]
         
-        backups = self.get_backup_files()
+        names = self._names()
         
-        # Remove excess backups
-        if len(backups) > max_backups:
-            for backup in backups[max_backups:]:
+        # Remove excess backups, oldest first
+        if len(names) > max_backups:
+            while len(names) > max_backups:
                 try:
-                    filepath = os.path.join(self.backup_dir, backup["filename"])
-                    os.remove(filepath)
+                    os.remove(os.path.join(self.backup_dir, names.popleft()))
                 except OSError:
                     continue
+            self.invalidate_cache()
     
     def delete_backup_files(self, filenames: List[str]) -> Dict:
         """Delete specific backup files"""
@@ -138,22 +229,24 @@ class BackupService:
         
         for filename in filenames:
             # Security check - ensure filename is a valid backup file
-            if not (filename.startswith("rentals_backup_") and filename.endswith(".db")):
+            if not _is_backup(filename):
                 failed.append(f"{filename}: Invalid backup filename")
                 continue
                 
             filepath = os.path.join(self.backup_dir, filename)
             
-            if not os.path.exists(filepath):
-                failed.append(f"{filename}: File not found")
-                continue
-                
             try:
                 os.remove(filepath)
                 deleted.append(filename)
+                self._forget_backup(filename)
+            except FileNotFoundError:
+                failed.append(f"{filename}: File not found")
             except OSError as e:
                 failed.append(f"{filename}: {str(e)}")
         
+        if deleted:
+            self.invalidate_cache()
+        
         return {
             "deleted": deleted,
             "failed": failed,
@@ -163,7 +256,7 @@ class BackupService:
     def get_backup_file_path(self, filename: str) -> Optional[str]:
         """Get full path to backup file if it exists and is valid"""
         # Security check
-        if not (filename.startswith("rentals_backup_") and filename.endswith(".db")):
+        if not _is_backup(filename):
             return None
             
         filepath = os.path.join(self.backup_dir, filename)
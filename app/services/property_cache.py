@@ -0,0 +1,113 @@
+"""
+Property lookup helpers, including an in-process LRU cache of property rows
+for the read-mostly page routes and a short-lived cache of serialized API
+responses
+"""
+import time
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..models.property import Property
+
+PROPERTY_CACHE_SIZE = 512
+
+# Seconds a cached row or serialized API response is reused; bounds how stale
+# another worker process can be, since invalidation only reaches this process,
+# and how long a row read just before an invalidation can outlive it
+PROPERTY_API_TTL = 60
+
+# Only the fields the detail and edit templates render; images, notes and
+# travel times are fetched client-side from the API
+_PAGE_COLUMNS = (
+    Property.id,
+    Property.address,
+    Property.property_type,
+    Property.price_per_month,
+    Property.square_footage,
+    Property.description,
+    Property.contacts,
+    Property.cat_friendly,
+    Property.air_conditioning,
+    Property.on_premises_parking,
+)
+
+# property_id -> (expires_at, row)
+_cache: "OrderedDict[int, Tuple[float, Dict]]" = OrderedDict()
+# property_id -> (expires_at, etag, JSON body)
+_api_cache: "OrderedDict[int, Tuple[float, str, bytes]]" = OrderedDict()
+_lock = Lock()
+
+
+def property_exists(db: Session, property_id: int) -> bool:
+    """Check a property exists without loading the row"""
+    return db.query(Property.id).filter(Property.id == property_id).scalar() is not None
+
+
+def get_property_cached(db: Session, property_id: int) -> Optional[Dict]:
+    """
+    Get a snapshot of a property's page fields, served from memory when possible.
+    
+    Args:
+        db: Database session used on a cache miss
+        property_id: ID of the property
+        
+    Returns:
+        Dictionary of column values, or None if the property doesn't exist
+    """
+    with _lock:
+        entry = _cache.get(property_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                _cache.move_to_end(property_id)
+                return entry[1]
+            del _cache[property_id]
+    
+    # Plain column query: no ORM object or identity map bookkeeping needed
+    result = db.query(*_PAGE_COLUMNS).filter(Property.id == property_id).first()
+    if result is None:
+        return None
+    
+    row = result._asdict()
+    with _lock:
+        _cache[property_id] = (time.monotonic() + PROPERTY_API_TTL, row)
+        if len(_cache) > PROPERTY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return row
+
+
+def get_property_api_cached(property_id: int) -> Optional[Tuple[str, bytes]]:
+    """Return the cached (etag, JSON body) of a property's API response, if fresh"""
+    with _lock:
+        entry = _api_cache.get(property_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _api_cache[property_id]
+            return None
+        _api_cache.move_to_end(property_id)
+        return entry[1], entry[2]
+
+
+def store_property_api(property_id: int, body: bytes) -> Tuple[str, bytes]:
+    """Cache a property's serialized API response and return (etag, body)"""
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    with _lock:
+        _api_cache[property_id] = (time.monotonic() + PROPERTY_API_TTL, etag, body)
+        if len(_api_cache) > PROPERTY_CACHE_SIZE:
+            _api_cache.popitem(last=False)
+    return etag, body
+
+
+def invalidate_property(property_id: Optional[int] = None):
+    """Drop one property from the caches, or everything if no ID is given"""
+    with _lock:
+        if property_id is None:
+            _cache.clear()
+            _api_cache.clear()
+        else:
+            _cache.pop(property_id, None)
+            _api_cache.pop(property_id, None)
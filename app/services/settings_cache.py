@@ -0,0 +1,58 @@
+"""
+In-process cache of the single global Settings row, which nearly every
+property write reads and only the settings page changes
+"""
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..models.settings import Settings
+
+_MISSING = object()
+
+_SETTINGS_CACHE: Dict[str, Optional[Dict]] = {}
+
+
+def get_settings_cached(db: Session) -> Optional[Dict]:
+    """
+    Get the global settings, served from memory after the first lookup.
+    
+    Args:
+        db: Database session used on a cache miss
+        
+    Returns:
+        Dictionary with id, origin_address, origin_lat and origin_lng, or None
+        if no settings row exists
+    """
+    settings = _SETTINGS_CACHE.get("settings", _MISSING)
+    if settings is _MISSING:
+        row = db.query(
+            Settings.id, Settings.origin_address, Settings.origin_lat, Settings.origin_lng
+        ).first()
+        settings = row._asdict() if row is not None else None
+        _SETTINGS_CACHE["settings"] = settings
+    return settings
+
+
+def cache_settings(settings: Settings) -> Dict:
+    """Store a freshly committed Settings row as the cached value"""
+    cached = {
+        "id": settings.id,
+        "origin_address": settings.origin_address,
+        "origin_lat": settings.origin_lat,
+        "origin_lng": settings.origin_lng,
+    }
+    _SETTINGS_CACHE["settings"] = cached
+    return cached
+
+
+def origin_coords(settings: Dict) -> Optional[Tuple[float, float]]:
+    """Return the stored (lat, lng) of the origin address, if it was geocoded"""
+    if settings["origin_lat"] is None or settings["origin_lng"] is None:
+        return None
+    return settings["origin_lat"], settings["origin_lng"]
+
+
+def invalidate_settings():
+    """Forget the cached settings so the next lookup reads the database"""
+    _SETTINGS_CACHE.clear()
@@ -0,0 +1,156 @@
+"""
+Persistent cache for Google Maps travel-time lookups.
+
+A lookup costs five Distance Matrix requests and gives the same answer for
+the same addresses and day, so results are kept in the travel_time_cache
+table and reused for a week. Single time slots are also kept in memory for
+an hour, so a lookup that is retried after one slot failed only repeats the
+requests that are actually missing. Geocoded addresses are kept in the
+same table for a month.
+"""
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from typing import Optional, Tuple
+
+from ..database import SessionLocal
+from ..models.travel_cache import TravelTimeCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached lookup stays valid
+TRAVEL_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Seconds a geocoded address stays valid; addresses don't move
+GEOCODE_CACHE_TTL = 30 * 24 * 60 * 60
+
+# In-memory cache of single-slot results
+SLOT_CACHE_SIZE = 1024
+SLOT_CACHE_TTL = 60 * 60
+SLOT_BUCKET_SECONDS = 30 * 60
+
+TIME_SLOTS = ('travel_time_830am', 'travel_time_930am', 'travel_time_midday',
+              'travel_time_630pm', 'travel_time_730pm')
+
+
+def make_key(*parts) -> str:
+    """Hash the lookup arguments into a cache key"""
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def get(key: str) -> Optional[dict]:
+    """Return the cached payload for key, or None if missing or expired"""
+    with SessionLocal() as db:
+        entry = db.get(TravelTimeCache, key)
+        if entry is None or entry.expires_at <= time.time():
+            return None
+        return entry.payload
+
+
+def put(key: str, payload: dict, ttl: int = TRAVEL_CACHE_TTL):
+    """Store payload under key for ttl seconds"""
+    with SessionLocal() as db:
+        db.merge(TravelTimeCache(key=key, payload=payload, expires_at=int(time.time()) + ttl))
+        db.commit()
+
+
+_slot_cache: "OrderedDict[Tuple[str, str, int], Tuple[float, dict]]" = OrderedDict()
+_slot_lock = Lock()
+
+
+def cached_slot(func):
+    """
+    Cache TravelTimeService._get_travel_time results in memory.
+    
+    Keyed by origin, destination and the 30-minute departure bucket; only
+    successful lookups are stored.
+    """
+    @wraps(func)
+    def wrapper(service, origin: str, destination: str, departure_time: int):
+        key = (origin, destination, departure_time // SLOT_BUCKET_SECONDS)
+        now = time.monotonic()
+        with _slot_lock:
+            entry = _slot_cache.get(key)
+            if entry is not None and entry[0] > now:
+                _slot_cache.move_to_end(key)
+                return entry[1]
+        
+        result = func(service, origin, destination, departure_time)
+        if result is not None:
+            with _slot_lock:
+                _slot_cache[key] = (now + SLOT_CACHE_TTL, result)
+                _slot_cache.move_to_end(key)
+                if len(_slot_cache) > SLOT_CACHE_SIZE:
+                    _slot_cache.popitem(last=False)
+        return result
+    
+    return wrapper
+
+
+def cached_travel_times(func):
+    """
+    Cache TravelTimeService.calculate_travel_times results.
+    
+    The key includes the departure day, since "next Monday" moves on every
+    week. Only complete Google Maps results are stored: fallback estimates
+    and lookups with a failed time slot are recalculated next time.
+    """
+    @wraps(func)
+    def wrapper(service, origin: str, destination: str, use_tuesday: bool = False, day_offset: int = 0,
+                origin_coords=None):
+        if not service.api_key or not origin or not destination:
+            return func(service, origin, destination, use_tuesday, day_offset, origin_coords)
+        
+        day = service._get_target_date(day_offset, use_tuesday).date()
+        key = make_key(origin, destination, use_tuesday, day_offset, day.isoformat())
+        
+        try:
+            cached = get(key)
+        except Exception as e:
+            logger.warning(f"Travel time cache lookup failed: {e}")
+            cached = None
+        if cached is not None:
+            return cached
+        
+        travel_times = func(service, origin, destination, use_tuesday, day_offset, origin_coords)
+        if all(travel_times.get(slot) is not None for slot in TIME_SLOTS):
+            try:
+                put(key, travel_times)
+            except Exception as e:
+                logger.warning(f"Could not cache travel times: {e}")
+        return travel_times
+    
+    return wrapper
+
+
+def cached_geocode(func):
+    """
+    Cache TravelTimeService.geocode results in the travel_time_cache table.
+    
+    Addresses are normalized for the key, so spacing and case differences
+    share an entry. Failed lookups (None) are not stored.
+    """
+    @wraps(func)
+    def wrapper(service, address: str):
+        key = make_key("geocode", " ".join(address.lower().split()))
+        
+        try:
+            cached = get(key)
+        except Exception as e:
+            logger.warning(f"Geocode cache lookup failed: {e}")
+            cached = None
+        if cached is not None:
+            return tuple(cached)
+        
+        coords = func(service, address)
+        if coords is not None:
+            try:
+                put(key, list(coords), GEOCODE_CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"Could not cache geocode result: {e}")
+        return coords
+    
+    return wrapper
@@ -1,17 +1,81 @@
 import os
+import math
+import time
 import requests
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median_high
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import logging
+from .travel_cache import cached_travel_times, cached_slot, cached_geocode
 
 logger = logging.getLogger(__name__)
 
+# Travel time column and departure hour/minute for each slot
+DEPARTURE_SLOTS = (
+    ('travel_time_830am', 8, 30),
+    ('travel_time_930am', 9, 30),
+    ('travel_time_midday', 12, 0),
+    ('travel_time_630pm', 18, 30),
+    ('travel_time_730pm', 19, 30),
+)
+
+# The five departure slots are requested at once rather than one after
+# another; shared so concurrent lookups don't each start their own threads
+_SLOT_POOL = ThreadPoolExecutor(max_workers=10, thread_name_prefix="distance-matrix")
+
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+
+# Seconds to wait for a connection and for a response on any lookup
+HTTP_TIMEOUT = (5, 15)
+
+
+def _make_session() -> requests.Session:
+    """HTTP session whose connections (and TLS handshakes) are reused across lookups"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=3, backoff_factor=0.3)
+    )
+    session.mount("https://", adapter)
+    # Nominatim is never retried: every request has to go through
+    # _wait_for_nominatim, and retries would skip the rate limit
+    session.mount(NOMINATIM_URL, HTTPAdapter(max_retries=0))
+    return session
+
+
+# Shared by every TravelTimeService, which is created per request
+_HTTP = _make_session()
+
+# Nominatim's usage policy allows at most one request per second
+NOMINATIM_MIN_INTERVAL = 1.0
+_nominatim_lock = Lock()
+_nominatim_last = 0.0
+
+
+def _wait_for_nominatim():
+    """Block until another Nominatim request is allowed, and claim the slot"""
+    global _nominatim_last
+    with _nominatim_lock:
+        delay = _nominatim_last + NOMINATIM_MIN_INTERVAL - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        _nominatim_last = time.monotonic()
+
 class TravelTimeService:
     def __init__(self):
         self.api_key = os.getenv('GOOGLE_MAPS_API_KEY')
         self.base_url = "https://maps.googleapis.com/maps/api/distancematrix/json"
+        self.session = _HTTP
     
-    def calculate_travel_times(self, origin: str, destination: str, use_tuesday: bool = False, day_offset: int = 0) -> Dict[str, Optional[float]]:
+    @cached_travel_times
+    def calculate_travel_times(self, origin: str, destination: str, use_tuesday: bool = False, day_offset: int = 0,
+                               origin_coords: Optional[Tuple[float, float]] = None) -> Dict[str, Optional[float]]:
         """
         Calculate travel times for all time slots.
         
@@ -20,6 +84,7 @@ class TravelTimeService:
             destination: Destination address
             use_tuesday: If True, use Tuesday instead of Monday (default: False)
             day_offset: Days to add/subtract from the target date (default: 0)
+            origin_coords: Already geocoded (lat, lng) of the origin, if known
             
         Returns:
             Dictionary with travel times and display formats
@@ -29,25 +94,29 @@ class TravelTimeService:
             
         if not self.api_key:
             logger.warning("Google Maps API key not found. Using fallback calculation.")
-            return self._fallback_calculation(origin, destination)
+            return self._fallback_calculation(origin, destination, origin_coords)
         
         travel_times = {}
+        # Every slot departs on the same day; work it out once
+        target_date = self._get_target_date(day_offset, use_tuesday)
         time_slots = {
-            'travel_time_830am': self._get_departure_time(8, 30, day_offset, use_tuesday),
-            'travel_time_930am': self._get_departure_time(9, 30, day_offset, use_tuesday),
-            'travel_time_midday': self._get_departure_time(12, 0, day_offset, use_tuesday),
-            'travel_time_630pm': self._get_departure_time(18, 30, day_offset, use_tuesday),
-            'travel_time_730pm': self._get_departure_time(19, 30, day_offset, use_tuesday)
+            time_key: int(target_date.replace(hour=hour, minute=minute).timestamp())
+            for time_key, hour, minute in DEPARTURE_SLOTS
         }
         
         # For anomaly detection
         all_times = []
         anomaly_detected = False
         
-        # First pass - calculate all times
-        for time_key, departure_time in time_slots.items():
+        # First pass - calculate all times; the requests run concurrently and
+        # the results are handled in slot order
+        lookups = {
+            time_key: _SLOT_POOL.submit(self._get_travel_time, origin, destination, departure_time)
+            for time_key, departure_time in time_slots.items()
+        }
+        for time_key, lookup in lookups.items():
             try:
-                travel_time_data = self._get_travel_time(origin, destination, departure_time)
+                travel_time_data = lookup.result()
                 if travel_time_data:
                     # Store the conservative (max) time for database storage
                     travel_times[time_key] = travel_time_data['conservative']
@@ -64,7 +133,7 @@ class TravelTimeService:
         
         # Check for anomalies if we have enough data
         if len(all_times) >= 3 and not anomaly_detected:
-            median_time = sorted(all_times)[len(all_times) // 2]
+            median_time = median_high(all_times)
             
             # Check for extreme outliers (more than 2x the median)
             for time_key in ['travel_time_830am', 'travel_time_930am']:
@@ -91,15 +160,8 @@ class TravelTimeService:
         
         return travel_times
     
-    def _get_departure_time(self, hour: int, minute: int, day_offset: int = 0, use_tuesday: bool = False) -> int:
-        """Get departure time as Unix timestamp for next Monday (or Tuesday) at specified time.
-        
-        Args:
-            hour: Hour of the day (24-hour format)
-            minute: Minute of the hour
-            day_offset: Days to add/subtract from the target date (default: 0)
-            use_tuesday: If True, use Tuesday instead of Monday (default: False)
-        """
+    def _get_target_date(self, day_offset: int = 0, use_tuesday: bool = False) -> datetime:
+        """Get midnight of next Monday (or Tuesday), shifted by day_offset days."""
         now = datetime.now()
         
         # Calculate for next Monday (0) or Tuesday (1)
@@ -109,10 +171,9 @@ class TravelTimeService:
             days_ahead = 7
         
         target_date = now + timedelta(days=days_ahead + day_offset)
-        departure_time = target_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        
-        return int(departure_time.timestamp())
+        return target_date.replace(hour=0, minute=0, second=0, microsecond=0)
     
+    @cached_slot
     def _get_travel_time(self, origin: str, destination: str, departure_time: int) -> Optional[dict]:
         """Get travel time from Google Maps API for specific departure time.
         Returns dict with 'min', 'max', and 'typical' times in minutes.
@@ -126,7 +187,7 @@ class TravelTimeService:
             'key': self.api_key
         }
         
-        response = requests.get(self.base_url, params=params)
+        response = self.session.get(self.base_url, params=params, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         
         data = response.json()
@@ -168,7 +229,8 @@ class TravelTimeService:
             'conservative': max_time  # Use max for planning purposes
         }
     
-    def _fallback_calculation(self, origin: str, destination: str) -> Dict[str, Optional[float]]:
+    def _fallback_calculation(self, origin: str, destination: str,
+                              origin_coords: Optional[Tuple[float, float]] = None) -> Dict[str, Optional[float]]:
         """
         Fallback calculation when Google Maps API is not available.
         This is a simple estimation and should be replaced with actual API calls.
@@ -179,7 +241,7 @@ class TravelTimeService:
         # This is very rough and should be replaced with actual API integration
         try:
             # Use a simple geocoding service to estimate distance
-            base_time = self._estimate_base_travel_time(origin, destination)
+            base_time = self._estimate_base_travel_time(origin, destination, origin_coords)
             
             # Apply traffic multipliers for different times
             travel_times = {
@@ -210,15 +272,17 @@ class TravelTimeService:
                 'travel_time_730pm': None
             }
     
-    def _estimate_base_travel_time(self, origin: str, destination: str) -> Optional[float]:
+    def _estimate_base_travel_time(self, origin: str, destination: str,
+                                   origin_coords: Optional[Tuple[float, float]] = None) -> Optional[float]:
         """
         Estimate base travel time using a simple distance calculation.
         This is a fallback method and not very accurate.
         """
         try:
             # Use OpenStreetMap Nominatim for basic geocoding (free)
-            origin_coords = self._geocode_address(origin)
-            dest_coords = self._geocode_address(destination)
+            if origin_coords is None:
+                origin_coords = self.geocode(origin)
+            dest_coords = self.geocode(destination)
             
             if not origin_coords or not dest_coords:
                 return None
@@ -237,10 +301,10 @@ class TravelTimeService:
             logger.error(f"Base travel time estimation failed: {e}")
             return None
     
-    def _geocode_address(self, address: str) -> Optional[tuple]:
+    @cached_geocode
+    def geocode(self, address: str) -> Optional[tuple]:
         """Geocode address using Nominatim (OpenStreetMap)."""
         try:
-            url = "https://nominatim.openstreetmap.org/search"
             params = {
                 'q': address,
                 'format': 'json',
@@ -248,7 +312,8 @@ class TravelTimeService:
             }
             headers = {'User-Agent': 'RentalRecon/1.0'}
             
-            response = requests.get(url, params=params, headers=headers)
+            _wait_for_nominatim()
+            response = self.session.get(NOMINATIM_URL, params=params, headers=headers, timeout=HTTP_TIMEOUT)
             response.raise_for_status()
             
             data = response.json()
@@ -261,18 +326,18 @@ class TravelTimeService:
             return None
     
     def _haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calculate the great circle distance between two points on Earth."""
-        import math
+        """
+        Calculate the distance in kilometers between two points on Earth.
         
+        Uses the equirectangular approximation, which is well under 1% off the
+        great circle distance at the city scale this estimate is used for.
+        """
         # Convert latitude and longitude from degrees to radians
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+        lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
         
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
+        x = (lon2 - lon1) * math.cos((lat1 + lat2) / 2)
+        y = lat2 - lat1
         
         # Radius of earth in kilometers
         r = 6371
-        return c * r
+        return math.hypot(x, y) * r
@@ -0,0 +1,21 @@
+"""
+Shared Jinja2 template environment
+"""
+import os
+import jinja2
+from fastapi.templating import Jinja2Templates
+
+TEMPLATE_DIR = "app/templates"
+TEMPLATE_CACHE_DIR = ".jinja_cache"
+
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+
+# One environment for the whole app so each template is parsed and compiled
+# once per process; the bytecode cache also skips compilation across restarts.
+# Templates only change on deploy (which restarts the service), so mtime checks
+# on every render are off unless JINJA_AUTO_RELOAD=1 is set for development.
+templates = Jinja2Templates(
+    directory=TEMPLATE_DIR,
+    bytecode_cache=jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+    auto_reload=os.getenv('JINJA_AUTO_RELOAD', '') == '1'
+)
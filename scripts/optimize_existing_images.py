@@ -9,26 +9,37 @@ This script will:
 4. Update the database with the new filename if the format changed
 """
 import os
+import queue
+import multiprocessing
 import sys
+import threading
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from PIL import Image
+from sqlalchemy.exc import IntegrityError
 
 # Add the project root to the Python path
 project_root = str(Path(__file__).parent.parent)
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+def _setup_logging():
+    """Log to the console and optimize_images.log, replacing any existing handlers"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('optimize_images.log')
+        ],
+        force=True
+    )
+
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('optimize_images.log')
-    ]
-)
+_setup_logging()
 logger = logging.getLogger(__name__)
 
 # Import database models after setting up the path
@@ -36,225 +47,371 @@ from app.database import SessionLocal, engine
 from app.models.property import Property, PropertyImage
 from app.services.image_processor import ImageProcessor
 
+# Extensions of the image files to optimize, as a tuple for str.endswith
+_IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# A re-encode has to be at least this much smaller than the original to
+# replace it; otherwise it only adds a generation of compression artifacts
+_MIN_SAVING = 0.03
+
+
+def _init_worker():
+    """Set up a worker: its own log handlers, and the Pillow format plugins loaded once"""
+    _setup_logging()
+    Image.init()
+
+
+def _optimize_one(image_path: str, dry_run: bool = False) -> Optional[Tuple[str, Optional[dict]]]:
+    """
+    Optimize a single image file and write the result next to it.
+    
+    A plain module-level function with no database or instance state, so it
+    can run in a worker process. Only the new filename and the metadata come
+    back, not the image data.
+    
+    Args:
+        image_path: Path to the image file
+        dry_run: Work out the result but don't write the new file
+        
+    Returns:
+        Tuple of (new_filename, metadata_dict), or None if the file was
+        skipped or could not be optimized. If the original should be kept,
+        new_filename is the original name and the metadata is None for a
+        web-ready JPEG, or just {'is_optimized': True} when re-encoding
+        didn't make it smaller
+    """
+    try:
+        # Skip already optimized files (assuming they end with _optimized)
+        if '_optimized' in image_path:
+            return None
+        
+        old_filename = os.path.basename(image_path)
+        with open(image_path, 'rb') as f:
+            # A JPEG that already fits and is small enough would only pick up a
+            # second generation of compression artifacts from a re-encode.
+            # Only files small enough to qualify are read whole for the check.
+            original_size = os.fstat(f.fileno()).st_size
+            if original_size <= ImageProcessor.PASSTHROUGH_MAX_BYTES:
+                image_data = f.read()
+                if ImageProcessor.get_passthrough_metadata(image_data) is not None:
+                    return old_filename, None
+            else:
+                image_data = f
+            
+            # Process the image; larger files are decoded straight from disk
+            processed_data, _, metadata = ImageProcessor.process_image_data(
+                image_data,
+                old_filename,
+                target_format='JPEG',  # for consistency
+            )
+            
+            # Keep the original if the re-encode isn't meaningfully smaller,
+            # unless it had to be scaled down to fit; only the header is read
+            if len(processed_data) > original_size * (1 - _MIN_SAVING):
+                f.seek(0)
+                with Image.open(f) as source:
+                    resized = source.size != (metadata['width'], metadata['height'])
+                if not resized:
+                    return old_filename, {'is_optimized': True}
+        
+        # Generate the new path and filename next to the original; every image
+        # the scan passes has an extension, so rpartition always finds the dot
+        new_path = image_path.rpartition('.')[0] + '_optimized.jpg'
+        new_filename = os.path.basename(new_path)
+        
+        if not dry_run:
+            # Write under a temporary name and rename into place, so a crash
+            # never leaves a partial _optimized file that later runs would skip.
+            # The original isn't overwritten in place: image URLs are served
+            # as immutable, so browsers would keep showing the old bytes.
+            with open(new_path + '.tmp', 'wb') as f:
+                f.write(processed_data)
+            os.replace(new_path + '.tmp', new_path)
+        
+        return new_filename, metadata
+        
+    except Exception as e:
+        logger.error(f"Error optimizing {image_path}: {str(e)}")
+        return None
+
+
 class ImageOptimizer:
     """Handles optimization of existing images."""
     
+    # Row updates are committed in batches of this size by the writer thread
+    BATCH_SIZE = 64
+    
     def __init__(self, base_dir: str = "app/static/images"):
         """Initialize with the base directory for property images."""
         self.base_dir = os.path.abspath(base_dir)
         self.image_processor = ImageProcessor()
         self.db = SessionLocal()
         
-    def get_all_property_dirs(self) -> List[str]:
-        """Get all property image directories."""
+    def get_all_property_dirs(self) -> Iterator[str]:
+        """Yield each property image directory as it is listed."""
         try:
-            return [
-                os.path.join(self.base_dir, d) 
-                for d in os.listdir(self.base_dir) 
-                if d.startswith('property_') and os.path.isdir(os.path.join(self.base_dir, d))
-            ]
+            # scandir entries carry the file type from the directory listing,
+            # so is_dir() doesn't need a stat() per entry
+            with os.scandir(self.base_dir) as entries:
+                for e in entries:
+                    if e.name.startswith('property_') and e.is_dir():
+                        yield e.path
         except FileNotFoundError:
             logger.error(f"Base directory not found: {self.base_dir}")
-            return []
     
-    def get_images_in_dir(self, dir_path: str) -> List[Tuple[str, str]]:
-        """Get all image files in a directory."""
+    def get_images_in_dir(self, dir_path: str) -> Iterator[Tuple[str, str]]:
+        """Yield (filename, path) for each image file in a directory."""
         if not os.path.exists(dir_path):
-            return []
+            return
             
-        image_exts = {'.jpg', '.jpeg', '.png', '.webp'}
-        return [
-            (f, os.path.join(dir_path, f)) 
-            for f in os.listdir(dir_path)
-            if os.path.splitext(f)[1].lower() in image_exts
-        ]
+        with os.scandir(dir_path) as entries:
+            for e in entries:
+                if e.name.lower().endswith(_IMAGE_EXTS):
+                    yield e.name, e.path
     
-    def optimize_image(self, image_path: str) -> Optional[Tuple[bytes, str]]:
-        """Optimize a single image file."""
-        try:
-            # Skip already optimized files (assuming they end with _optimized)
-            if '_optimized' in image_path:
-                return None
-                
-            # Read the image
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
-            
-            # Process the image
-            processed_data = self.image_processor.optimize_image(
-                image_data,
-                target_format='JPEG',  # for consistency
-            )
-            
-            # Generate new filename
-            old_filename = os.path.basename(image_path)
-            name, ext = os.path.splitext(old_filename)
-            new_filename = f"{name}_optimized.jpg"
-            
-            return processed_data, new_filename
-            
-        except Exception as e:
-            logger.error(f"Error optimizing {image_path}: {str(e)}")
-            return None
+    def optimize_image(self, image_path: str, dry_run: bool = False) -> Optional[Tuple[str, Optional[dict]]]:
+        """Optimize a single image file, writing the result next to it."""
+        return _optimize_one(image_path, dry_run)
+    
+    def get_image_ids(self) -> Dict[Tuple[int, str], Tuple[int, bool]]:
+        """
+        Look up the ids of all image rows at once.
+        
+        Returns:
+            Dict mapping (property_id, filename) to the PropertyImage id and
+            its is_optimized flag
+        """
+        rows = self.db.query(
+            PropertyImage.id, PropertyImage.property_id, PropertyImage.filename, PropertyImage.is_optimized
+        )
+        return {
+            (property_id, filename): (image_id, bool(is_optimized))
+            for image_id, property_id, filename, is_optimized in rows
+        }
     
-    def update_database_references(
-        self, 
-        property_id: int, 
-        old_filename: str, 
+    def build_update(
+        self,
+        image_id: int,
         new_filename: str,
-        image_data: bytes = None,
+        metadata: dict,
         original_format: str = None
-    ) -> bool:
+    ) -> dict:
         """
-        Update the database with the new filename and metadata.
+        Build the row update for an optimized image, for bulk_update_mappings.
+        
+        The metadata comes from the encoder, so the new file doesn't need to
+        be parsed again.
+        """
+        return {
+            'id': image_id,
+            'filename': new_filename,
+            'width': metadata['width'],
+            'height': metadata['height'],
+            'format': metadata['format'],
+            'size_kb': metadata['size_kb'],
+            'is_optimized': True,
+            'original_format': original_format.upper() if original_format else None
+        }
+    
+    def save_updates(self, updates: List[dict]) -> List[bool]:
+        """
+        Write a batch of image row updates with one commit.
+        
+        If the batch breaks a constraint (such as a new filename that is
+        already taken), it is retried one row per commit so the other rows
+        in the batch still point at their new files.
         
-        Args:
-            property_id: ID of the property
-            old_filename: Original filename in the database
-            new_filename: New filename after optimization
-            image_data: The processed image data (for extracting metadata)
-            original_format: Original format of the image if it was converted
-            
         Returns:
-            bool: True if update was successful, False otherwise
+            List[bool]: Whether each update was committed
         """
         try:
-            # Find the image in the database
-            db_image = self.db.query(PropertyImage).filter(
-                PropertyImage.property_id == property_id,
-                PropertyImage.filename == old_filename
-            ).first()
-            
-            if not db_image:
-                logger.warning(f"No database entry found for {old_filename}")
-                return False
-                
-            # Update the filename
-            db_image.filename = new_filename
-            
-            # If we have image data, extract and update metadata
-            if image_data is not None:
-                try:
-                    # Open the image to get dimensions
-                    from io import BytesIO
-                    from PIL import Image
-                    
-                    img = Image.open(BytesIO(image_data))
-                    width, height = img.size
-                    
-                    # Update metadata fields
-                    db_image.width = width
-                    db_image.height = height
-                    db_image.format = img.format.upper() if hasattr(img, 'format') and img.format else 'JPEG'
-                    db_image.size_kb = len(image_data) / 1024.0  # Convert to KB
-                    db_image.is_optimized = True
-                    db_image.original_format = original_format.upper() if original_format else None
-                    
-                    logger.info(f"Updated metadata for {new_filename}: {width}x{height}px, {db_image.format}, {db_image.size_kb:.1f}KB")
-                    
-                except Exception as e:
-                    logger.error(f"Error extracting metadata for {new_filename}: {str(e)}")
-                    # Don't fail the whole operation if metadata extraction fails
-            
+            self.db.bulk_update_mappings(PropertyImage, updates)
+            self.db.commit()
+            logger.info(f"Updated {len(updates)} database references")
+            return [True] * len(updates)
+        except IntegrityError as e:
+            self.db.rollback()
+            logger.warning(f"Batch update failed, retrying row by row: {str(e)}")
+            return [self.save_update(update) for update in updates]
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error updating database references: {str(e)}")
+            return [False] * len(updates)
+    
+    def save_update(self, update: dict) -> bool:
+        """Write and commit a single image row update."""
+        try:
+            self.db.bulk_update_mappings(PropertyImage, [update])
             self.db.commit()
-            logger.info(f"Updated database reference: {old_filename} -> {new_filename}")
             return True
-                
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error updating database for {old_filename}: {str(e)}")
+            logger.error(f"Error updating database reference for image {update['id']}: {str(e)}")
             return False
     
+    def write_updates(self, pending: queue.Queue, failed: List[int]) -> None:
+        """
+        Commit row updates from the queue in batches, then remove the originals.
+        
+        Runs in its own thread, so the workers keep encoding while a commit
+        waits on the disk. Items are (update, filename, full_path) tuples, with
+        no full_path when the file is kept, and None marks the end. Originals
+        are only removed once the rows pointing at the new files are
+        committed; the number of updates that failed in each batch is
+        appended to failed.
+        """
+        batch = []
+        while True:
+            item = pending.get()
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= self.BATCH_SIZE):
+                saved = self.save_updates([update for update, _, _ in batch])
+                for (_, filename, full_path), ok in zip(batch, saved):
+                    if not ok or full_path is None:
+                        continue
+                    try:
+                        os.remove(full_path)
+                        logger.debug(f"Removed original file: {filename}")
+                    except Exception as e:
+                        logger.error(f"Error removing original file {filename}: {str(e)}")
+                failed.append(saved.count(False))
+                batch = []
+            if item is None:
+                return
+    
     def process_all_images(self, dry_run: bool = False) -> None:
         """Process all images in all property directories."""
-        property_dirs = self.get_all_property_dirs()
-        logger.info(f"Found {len(property_dirs)} property directories to process")
-        
         total_processed = 0
         total_optimized = 0
+        total_kept = 0
         total_errors = 0
         
-        for prop_dir in property_dirs:
-            try:
-                # Extract property ID from directory name
-                prop_id = int(prop_dir.split('_')[-1])
-                logger.info(f"Processing property {prop_id} - {prop_dir}")
-                
-                # Get all images in the directory
-                images = self.get_images_in_dir(prop_dir)
-                logger.info(f"Found {len(images)} images to process")
-                
-                for filename, full_path in images:
-                    total_processed += 1
-                    logger.info(f"Processing {filename}")
-                    
-                    # Skip already optimized files
-                    if '_optimized' in filename:
-                        logger.info(f"Skipping already optimized file: {filename}")
-                        continue
+        # The directories are scanned lazily as the pool takes paths, so the
+        # first images are encoding while later directories are still listed.
+        # Each job is recorded in order to pair it with its result.
+        jobs = []
+        claimed = set()
+        
+        def scan_images() -> Iterator[str]:
+            nonlocal total_processed, total_errors
+            for prop_dir in self.get_all_property_dirs():
+                try:
+                    # Extract property ID from directory name
+                    prop_id = int(prop_dir.split('_')[-1])
+                    found = 0
                     
-                    # Optimize the image
-                    try:
+                    for filename, full_path in self.get_images_in_dir(prop_dir):
+                        total_processed += 1
+                        found += 1
+                        
+                        # Skip already optimized files, by name or as recorded
+                        # in the database (app uploads, or files a re-encode
+                        # couldn't shrink)
+                        if '_optimized' in filename or image_ids.get((prop_id, filename), (None, False))[1]:
+                            logger.debug(f"Skipping already optimized file: {filename}")
+                            continue
+                        
+                        # Another row, or another file earlier in this run, already
+                        # uses the name the optimized file would get (x.png and
+                        # x.jpg both become x_optimized.jpg); writing it would
+                        # replace that image
+                        target = filename.rpartition('.')[0] + '_optimized.jpg'
+                        if (prop_id, target) in image_ids or (prop_id, target) in claimed:
+                            logger.warning(f"Skipping {filename}: {target} is already in use")
+                            total_errors += 1
+                            continue
+                        claimed.add((prop_id, target))
+                        
                         # Get the original format before optimization
-                        original_ext = os.path.splitext(filename)[1].lower().lstrip('.')
+                        original_ext = filename.rpartition('.')[2].lower()
                         if original_ext in ['heic', 'heif']:
                             original_format = original_ext.upper()
                         else:
                             original_format = None
-                            
-                        # Optimize the image
-                        result = self.optimize_image(full_path)
-                        if not result:
-                            logger.warning(f"Skipping {filename} (optimization failed or not needed)")
-                            total_errors += 1
-                            continue
                         
-                        processed_data, new_filename = result
-                        new_path = os.path.join(prop_dir, new_filename)
-                    except Exception as e:
-                        logger.error(f"Error processing {filename}: {str(e)}")
+                        jobs.append((prop_id, prop_dir, filename, full_path, original_format))
+                        yield full_path
+                    
+                    logger.info(f"Found {found} images for property {prop_id} - {prop_dir}")
+                
+                except Exception as e:
+                    logger.error(f"Error processing property directory {prop_dir}: {str(e)}")
+                    total_errors += 1
+        
+        # Find every row that may need updating with a single query
+        image_ids = self.get_image_ids()
+        
+        # Only the writer thread uses the session from here on
+        pending = queue.Queue(maxsize=4 * self.BATCH_SIZE)
+        failed = []
+        writer = threading.Thread(target=self.write_updates, args=(pending, failed))
+        writer.start()
+        
+        # Decode, re-encode and write the new files in worker processes;
+        # results come back in order and the writer thread does the database work
+        try:
+            # spawn rather than fork: the writer thread is already running,
+            # and its locks and the parent's log handlers must not be copied
+            with ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            ) as executor:
+                results = executor.map(
+                    partial(_optimize_one, dry_run=dry_run),
+                    scan_images(),
+                    chunksize=4
+                )
+                
+                for (prop_id, prop_dir, filename, full_path, original_format), result in zip(jobs, results):
+                    logger.debug(f"Processing {filename}")
+                    
+                    if not result:
+                        logger.warning(f"Skipping {filename} (optimization failed or not needed)")
                         total_errors += 1
                         continue
                     
+                    new_filename, metadata = result
+                    if new_filename == filename:
+                        total_kept += 1
+                        if metadata is None:
+                            logger.debug(f"Keeping {filename}: already web-ready")
+                            continue
+                        
+                        # Record it as optimized so later runs skip it
+                        logger.debug(f"Keeping {filename}: re-encoding didn't make it smaller")
+                        entry = image_ids.get((prop_id, filename))
+                        if entry is not None and not dry_run:
+                            pending.put(({'id': entry[0], **metadata}, filename, None))
+                        continue
+                    
                     if dry_run:
                         logger.info(f"[DRY RUN] Would optimize {filename} -> {new_filename}")
                         continue
                         
-                    # Save the optimized image
-                    try:
-                        with open(new_path, 'wb') as f:
-                            f.write(processed_data)
-                        
-                        # Update database references with metadata
-                        if self.update_database_references(
-                            prop_id, 
-                            filename, 
-                            new_filename,
-                            image_data=processed_data,
-                            original_format=original_format
-                        ):
-                            # Remove the old file if optimization was successful and database updated
-                            try:
-                                os.remove(full_path)
-                                logger.info(f"Removed original file: {filename}")
-                            except Exception as e:
-                                logger.error(f"Error removing original file {filename}: {str(e)}")
-                        
+                    image_id = image_ids.get((prop_id, filename), (None, False))[0]
+                    if image_id is None:
+                        # The optimized file is written, but the original stays
+                        logger.warning(f"No database entry found for {filename}")
                         total_optimized += 1
-                        logger.info(f"Successfully optimized {filename} -> {new_filename}")
-                        
-                    except Exception as e:
-                        logger.error(f"Error saving optimized image {new_filename}: {str(e)}")
-                        total_errors += 1
-            
-            except Exception as e:
-                logger.error(f"Error processing property directory {prop_dir}: {str(e)}")
-                total_errors += 1
+                        continue
+                    
+                    # The optimized image is already saved; the writer thread
+                    # commits the row and then removes the original
+                    pending.put((self.build_update(image_id, new_filename, metadata, original_format), filename, full_path))
+                    total_optimized += 1
+                    logger.debug(f"Successfully optimized {filename} -> {new_filename}")
+        finally:
+            pending.put(None)
+            writer.join()
+        total_errors += sum(failed)
         
         # Print summary
         logger.info("\n=== Optimization Complete ===")
         logger.info(f"Total images processed: {total_processed}")
         logger.info(f"Total images optimized: {total_optimized}")
+        logger.info(f"Total images kept as they were: {total_kept}")
         logger.info(f"Total errors: {total_errors}")
         
         if dry_run:
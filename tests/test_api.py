@@ -1,20 +1,55 @@
+import io
+import os
+import base64
+import sqlite3
+from datetime import datetime, timedelta
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from PIL import Image
 
 from app.main import app
+from app.routers import image as image_router
+from app.routers import property as property_router
+from app.services import backup_service as backup_module
+from app.services.backup_service import BackupService
+from app.services.travel_time import TravelTimeService
 from app.database import Base, get_db
+from app.services.property_cache import invalidate_property
+from app.services.settings_cache import invalidate_settings
+
+# Create test database in memory; StaticPool keeps the one connection, and
+# so the database, alive and shared with the TestClient's worker threads
+SQLALCHEMY_TEST_DATABASE_URL = "sqlite://"
+engine = create_engine(
+    SQLALCHEMY_TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+# pysqlite's own transaction handling breaks SAVEPOINT, so let SQLAlchemy
+# emit BEGIN itself; foreign keys are checked as in the app's engine
+@event.listens_for(engine, "connect")
+def _configure_connection(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
 
-# Create test database
-SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test_rentals.db"
-engine = create_engine(SQLALCHEMY_TEST_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+@event.listens_for(engine, "begin")
+def _emit_begin(conn):
+    conn.exec_driver_sql("BEGIN")
 
-# Override the get_db dependency
+# Connection holding the current test's outer transaction
+test_connection = None
+
+# Override the get_db dependency; each request's session joins the test's
+# transaction, and its commits only release a savepoint
 def override_get_db():
+    db = TestingSessionLocal(bind=test_connection, join_transaction_mode="create_savepoint")
     try:
-        db = TestingSessionLocal()
         yield db
     finally:
         db.close()
@@ -24,14 +59,57 @@ app.dependency_overrides[get_db] = override_get_db
 # Create test client
 client = TestClient(app)
 
-@pytest.fixture(scope="function")
-def test_db():
-    # Create the database tables
+@pytest.fixture(scope="session")
+def test_schema():
+    # Create the database tables once for the whole run
     Base.metadata.create_all(bind=engine)
     yield
-    # Drop the tables after test
+    # Drop the tables after the last test
     Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(scope="function")
+def test_db(test_schema):
+    # Run the test inside a transaction that is rolled back afterwards. The
+    # rollback hands the same ids to the next test, so the in-process caches
+    # are cleared on both sides of it.
+    global test_connection
+    invalidate_property()
+    invalidate_settings()
+    test_connection = engine.connect()
+    transaction = test_connection.begin()
+    yield
+    transaction.rollback()
+    test_connection.close()
+    test_connection = None
+    invalidate_property()
+    invalidate_settings()
+
+@pytest.fixture(scope="function")
+def image_root(tmp_path, monkeypatch):
+    # Keep the images a test saves out of app/static/images
+    monkeypatch.setattr(image_router, "IMAGE_ROOT", str(tmp_path))
+    monkeypatch.setattr(property_router, "IMAGE_ROOT", str(tmp_path))
+    image_router.ensure_image_dir.cache_clear()
+    yield tmp_path
+    image_router.ensure_image_dir.cache_clear()
+
+def create_test_property(address):
+    response = client.post(
+        "/api/properties/",
+        data={
+            "address": address,
+            "property_type": "Home",
+            "price_per_month": 1500,
+            "square_footage": 1000
+        }
+    )
+    return response.json()["id"]
+
+def jpeg_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
 def test_create_property(test_db):
     # Test creating a property
     response = client.post(
@@ -115,7 +193,7 @@ def test_update_property(test_db):
     assert data["property_type"] == "Apartment"
     assert data["cat_friendly"] is True
 
-def test_delete_property(test_db):
+def test_delete_property(test_db, image_root):
     # Create a property first
     response = client.post(
         "/api/properties/",
@@ -138,3 +216,205 @@ def test_delete_property(test_db):
     # Verify it's gone
     response = client.get(f"/api/properties/{property_id}")
     assert response.status_code == 404
+
+def test_read_property_not_modified(test_db):
+    # Create a property and read it once for its ETag
+    response = client.post(
+        "/api/properties/",
+        data={
+            "address": "Cached Address",
+            "property_type": "Home",
+            "price_per_month": 1500,
+            "square_footage": 1000
+        }
+    )
+    property_id = response.json()["id"]
+    response = client.get(f"/api/properties/{property_id}")
+    etag = response.headers["ETag"]
+    
+    # A matching If-None-Match gets an empty 304
+    response = client.get(f"/api/properties/{property_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    
+    # After an update the old ETag no longer matches
+    client.put(
+        f"/api/properties/{property_id}",
+        data={
+            "address": "Updated Cached Address",
+            "property_type": "Home",
+            "price_per_month": 1500,
+            "square_footage": 1000
+        }
+    )
+    response = client.get(f"/api/properties/{property_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["address"] == "Updated Cached Address"
+
+def test_delete_images(test_db, image_root):
+    # Paste three different images
+    property_id = create_test_property("Image Address")
+    images = [
+        client.post(
+            f"/api/properties/{property_id}/paste",
+            json={"image_data": base64.b64encode(jpeg_bytes(color)).decode()}
+        ).json()
+        for color in ("red", "green", "blue")
+    ]
+    image_dir = image_root / f"property_{property_id}"
+    assert len(list(image_dir.iterdir())) == 3
+    
+    # Delete two of them in one request
+    deleted = [images[0]["id"], images[1]["id"]]
+    response = client.request(
+        "DELETE",
+        f"/api/properties/{property_id}/images",
+        json={"ids": deleted}
+    )
+    assert response.status_code == 200
+    assert sorted(response.json()["deleted"]) == sorted(deleted)
+    
+    # Only the third image's row and file are left
+    remaining = client.get(f"/api/properties/{property_id}").json()["images"]
+    assert [image["id"] for image in remaining] == [images[2]["id"]]
+    assert [path.name for path in image_dir.iterdir()] == [images[2]["filename"]]
+
+def test_paste_same_image_twice(test_db, image_root):
+    property_id = create_test_property("Repeat Paste Address")
+    image_data = base64.b64encode(jpeg_bytes("red")).decode()
+    first, second = [
+        client.post(f"/api/properties/{property_id}/paste", json={"image_data": image_data})
+        for _ in range(2)
+    ]
+    assert first.status_code == 201
+    assert second.status_code == 201
+    
+    # The repeat resolves to the row and file stored the first time
+    assert second.json()["id"] == first.json()["id"]
+    assert second.json()["filename"] == first.json()["filename"]
+    image_dir = image_root / f"property_{property_id}"
+    assert [path.name for path in image_dir.iterdir()] == [first.json()["filename"]]
+    images = client.get(f"/api/properties/{property_id}").json()["images"]
+    assert [image["id"] for image in images] == [first.json()["id"]]
+
+def test_paste_different_images(test_db, image_root):
+    property_id = create_test_property("Distinct Paste Address")
+    pasted = [
+        client.post(
+            f"/api/properties/{property_id}/paste",
+            json={"image_data": base64.b64encode(jpeg_bytes(color)).decode()}
+        ).json()
+        for color in ("red", "blue")
+    ]
+    
+    # Different content gets its own file and row
+    assert pasted[0]["id"] != pasted[1]["id"]
+    assert pasted[0]["filename"] != pasted[1]["filename"]
+    image_dir = image_root / f"property_{property_id}"
+    assert sorted(path.name for path in image_dir.iterdir()) == sorted(image["filename"] for image in pasted)
+    images = client.get(f"/api/properties/{property_id}").json()["images"]
+    assert sorted(image["id"] for image in images) == sorted(image["id"] for image in pasted)
+
+def test_upload_images_batch(test_db, image_root):
+    property_id = create_test_property("Batch Upload Address")
+    
+    # One good image and one file that isn't an image at all
+    try:
+        response = client.post(
+            f"/api/properties/{property_id}/upload/batch",
+            files=[
+                ("files", ("good.jpg", jpeg_bytes("red"), "image/jpeg")),
+                ("files", ("bad.jpg", b"not an image", "image/jpeg"))
+            ]
+        )
+    finally:
+        image_router.shutdown_image_pool()
+    assert response.status_code == 201
+    data = response.json()
+    
+    # The good one is saved, the bad one is reported by its filename
+    assert len(data["images"]) == 1
+    assert list(data["errors"]) == ["bad.jpg"]
+    saved = data["images"][0]["filename"]
+    assert (image_root / f"property_{property_id}" / saved).exists()
+    images = client.get(f"/api/properties/{property_id}").json()["images"]
+    assert [image["filename"] for image in images] == [saved]
+
+def test_calculate_travel_times_batch(test_db, monkeypatch):
+    # Stand in for Nominatim and the Distance Matrix API
+    def fake_calculate(self, origin, destination, **kwargs):
+        if destination == "Unreachable Address":
+            raise ValueError("No route found")
+        return {"travel_time_830am": 25, "travel_time_930am": 20}
+    
+    monkeypatch.setattr(TravelTimeService, "geocode", lambda self, address: (47.6, -122.3))
+    monkeypatch.setattr(TravelTimeService, "calculate_travel_times", fake_calculate)
+    client.put("/api/settings/", data={"origin_address": "1 Origin Street"})
+    
+    reachable = create_test_property("Reachable Address")
+    unreachable = create_test_property("Unreachable Address")
+    response = client.post(
+        "/api/properties/calculate-travel-times/batch",
+        json={"ids": [reachable, unreachable]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert list(data["results"]) == [str(reachable)]
+    assert data["errors"] == {str(unreachable): "No route found"}
+    
+    # Only the property that got results was written
+    assert client.get(f"/api/properties/{reachable}").json()["travel_time_830am"] == 25.0
+    assert client.get(f"/api/properties/{unreachable}").json()["travel_time_830am"] is None
+
+@pytest.fixture(scope="function")
+def backup_service(tmp_path, monkeypatch):
+    # Backups are named by the second they're taken, so step a fake clock a
+    # minute per call to give each one its own name
+    ticks = iter(range(1000))
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2024, 1, 1, 12, 0) + timedelta(minutes=next(ticks))
+    monkeypatch.setattr(backup_module, "datetime", FakeDatetime)
+    
+    db_path = tmp_path / "rentals.db"
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("CREATE TABLE t (x)")
+    connection.close()
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    # A backup left by an earlier run, older than any made by the test
+    (backup_dir / "rentals_backup_20230101_000000.db").write_bytes(b"")
+    return BackupService(db_path=str(db_path), backup_dir=str(backup_dir))
+
+def backup_names(service):
+    return sorted(path for path in os.listdir(service.backup_dir) if path.endswith(".db"))
+
+def test_backup_rotation(backup_service):
+    assert backup_service.update_max_backups(2)
+    
+    # Each new backup pushes the oldest one out, starting with the one on disk
+    created = [backup_service.create_backup() for _ in range(3)]
+    assert all(result["success"] for result in created)
+    assert backup_names(backup_service) == sorted(result["filename"] for result in created[1:])
+    assert [backup["filename"] for backup in backup_service.get_backup_files()] == [
+        created[2]["filename"], created[1]["filename"]
+    ]
+
+def test_backup_delete_then_rotate(backup_service):
+    backup_service.update_max_backups(2)
+    first = backup_service.create_backup()["filename"]
+    second = backup_service.create_backup()["filename"]
+    assert backup_names(backup_service) == [first, second]
+    
+    # A deleted backup no longer counts towards the limit
+    result = backup_service.delete_backup_files([second, "not_a_backup.txt"])
+    assert result["deleted"] == [second]
+    assert backup_names(backup_service) == [first]
+    third = backup_service.create_backup()["filename"]
+    assert backup_names(backup_service) == [first, third]
+    
+    # The next one removes the oldest remaining backup again
+    fourth = backup_service.create_backup()["filename"]
+    assert backup_names(backup_service) == [third, fourth]